@@ -0,0 +1,151 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import traceback
+
+import dimensions
+import export
+import hinge
+import hinge_box
+from hinge import Hinge
+from hinge_box import HingeBox
+
+#Method arguments a row may set next to the constructor options
+hinge_box_args = ("wall_angle", "ceil_angle", "screw_closure", "standoffs")
+hinge_args = ("hinge_w", "arm_w_ratio")
+
+#Reads option rows from a .csv (one column per option, cells parsed as JSON when possible) or a .json list of objects
+def load_table(path):
+    if path.endswith(".json"):
+        with open(path) as f:
+            return json.load(f)
+    rows = []
+    with open(path, newline="") as f:
+        for raw in csv.DictReader(f):
+            row = {}
+            for key, val in raw.items():
+                if val is None or val.strip() == "":
+                    continue
+                try:
+                    row[key] = json.loads(val)
+                except ValueError:
+                    row[key] = val
+            rows.append(row)
+    return rows
+
+#Splits a row into (name, kind, constructor options, method arguments)
+def parse_row(index, row):
+    if not isinstance(row, dict):
+        raise ValueError("row must be an object of options, got %s" % type(row).__name__)
+    row = dict(row)
+    name = str(row.pop("name", "row%d" % index))
+    kind = row.pop("kind", "hinge_box")
+    if kind == "hinge_box":
+        opts_keys, arg_keys = hinge_box.default_opts, hinge_box_args
+    elif kind == "hinge":
+        opts_keys, arg_keys = hinge.default_opts, hinge_args
+    else:
+        raise ValueError("unknown kind %r" % kind)
+    unknown = [key for key in row if key not in opts_keys and key not in arg_keys]
+    if unknown:
+        raise ValueError("unknown %s options: %s" % (kind, ", ".join(unknown)))
+    opts = {key: val for key, val in row.items() if key in opts_keys}
+    args = {key: val for key, val in row.items() if key in arg_keys}
+    return name, kind, opts, args
+
+#Checks a row with the dimensions engine without building anything; returns (row, problems)
+#With clamp, a hinge row's chamfer and fillet are pulled inside their limits and written back into the returned row
+def check_row(index, row, clamp=False):
+    try:
+        name, kind, opts, args = parse_row(index, row)
+    except ValueError as e:
+        return row, [str(e)]
+    problems = dimensions.type_problems(args, [key for key in ("hinge_w", "arm_w_ratio", "wall_angle", "ceil_angle") if key in args])
+    if problems:
+        return row, problems
+    if kind == "hinge_box":
+        return row, dimensions.check_hinge_box(dimensions.merged(hinge_box.default_opts, opts), hinge.default_opts, args.get("screw_closure", 1))[2]
+    o = dimensions.merged(hinge.default_opts, opts)
+    if "hinge_w" in args:
+        socket_arm_w, ball_arm_w = dimensions.fixed_width_arms(args["hinge_w"], o["n_socket_arms"], args.get("arm_w_ratio", 0.5))
+        o.update(socket_arm_w=socket_arm_w, ball_arm_w=ball_arm_w)
+    o, problems = dimensions.check_hinge(o, clamp)
+    if clamp and not problems:
+        row = dict(row, arm_base_chamfer=o["arm_base_chamfer"], arm_corner_fillet=o["arm_corner_fillet"])
+    return row, problems
+
+#Builds one row and exports it; runs inside a worker process
+def build_row(index, row, out_dir, export_opts={}):
+    name, kind, opts, args = parse_row(index, row)
+    #The pool already keeps every core busy, so OCC's own boolean threads would only oversubscribe them
+    opts.setdefault("parallel_booleans", 0)
+
+    start = time.perf_counter()
+    if kind == "hinge_box":
+        shape = HingeBox(**opts).hinge_box(**args)
+    elif "hinge_w" in args:
+        shape = Hinge(**opts).fixed_width_hinge(args.pop("hinge_w"), n_socket_arms=opts.get("n_socket_arms", hinge.default_opts["n_socket_arms"]), **args)
+    else:
+        shape = Hinge(**opts).hinge()
+    path = export.export_shapes({name: shape}, out_dir=out_dir, workers=1, **export_opts)[name]
+    return {"name": name, "path": path, "seconds": round(time.perf_counter() - start, 3)}
+
+def _run_row(index, row, out_dir, export_opts):
+    try:
+        return dict(build_row(index, row, out_dir, export_opts), row=index, ok=True)
+    except Exception as e:
+        return {"row": index, "name": row.get("name"), "ok": False, "error": "%s: %s" % (type(e).__name__, e), "traceback": traceback.format_exc()}
+
+#Builds every row across a process pool and yields one result dict per row as soon as it finishes
+#A failing row yields {"ok": False, "error": ...} instead of stopping the run
+#Rows the dimensions engine rejects are yielded straight away with "pruned": True and never reach a worker; clamp fixes what it can instead
+#export_opts are passed on to export.export_shapes (format, preset, tolerance, angular_tolerance)
+def run_batch(rows, out_dir="stl/batch", workers=None, export_opts={}, clamp=False):
+    os.makedirs(out_dir, exist_ok=True)
+    feasible = {}
+    for i, row in enumerate(rows):
+        try:
+            row, problems = check_row(i, row, clamp)
+        except Exception as e:
+            problems = ["%s: %s" % (type(e).__name__, e)]
+        if problems:
+            yield {"row": i, "name": row.get("name") if isinstance(row, dict) else None, "ok": False, "pruned": True, "error": "ValueError: " + "; ".join(problems)}
+        else:
+            feasible[i] = row
+    if not feasible:
+        return
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    #spawn, not fork: forking after OCC's thread pool has started can deadlock the workers
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(_run_row, i, row, out_dir, export_opts): i for i, row in feasible.items()}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                #The worker itself died (e.g. a crash inside OCC), so only the row number is known
+                yield {"row": index, "name": rows[index].get("name"), "ok": False, "error": "%s: %s" % (type(e).__name__, e)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and export a table of Hinge/HingeBox option sets in parallel")
+    parser.add_argument("table", help=".csv or .json table, one option set per row")
+    parser.add_argument("--out", default="stl/batch", help="directory the meshes are written to")
+    parser.add_argument("--format", default="stl", choices=["stl", "3mf"])
+    parser.add_argument("--preset", default="coarse", choices=sorted(export.presets), help="tessellation preset")
+    parser.add_argument("--clamp", action="store_true", help="clamp out-of-range hinge chamfers and fillets instead of skipping the row")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for result in run_batch(load_table(args.table), args.out, args.workers, {"format": args.format, "preset": args.preset}, args.clamp):
+        result.pop("traceback", None)
+        failed += not result["ok"]
+        print(json.dumps(result), flush=True)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
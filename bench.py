@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+#Each case runs in a fresh interpreter so wall time includes cold in-process caches and peak RSS is per case
+#Results are JSON so runs from different commits can be diffed with --compare
+
+def _slot_cutout(self, orig):
+    return orig.faces("<X").workplane(origin=(0, 0, self.opts["wall_thick"] + 8)).rect(12, 6).cutBlind(-self.opts["wall_thick"])
+
+def _lid_cutout(self, orig):
+    return orig.faces("<Z").workplane(origin=(self.box_ow/2 + self.box_oh + 4, 0, 0)).rect(10, 20, centered=[0,1]).cutThruAll()
+
+def _cases():
+    from hinge import Hinge
+    from hinge_box import HingeBox
+
+    cases = {
+        "hinge_unfolded": lambda: Hinge().hinge(),
+        "hinge_folded_90": lambda: Hinge(folded_angle=90).hinge(),
+    }
+    for w in (30, 60, 120):
+        for n in (2, 3, 6):
+            cases["fixed_width_hinge_w%d_n%d" % (w, n)] = lambda w=w, n=n: Hinge().fixed_width_hinge(w, n_socket_arms=n)
+    standoffs = [(15, 15), (-15, 15), (-15, -15), (15, -15)]
+    cases.update({
+        "hinge_box_plain": lambda: HingeBox().hinge_box(),
+        "hinge_box_folded_90": lambda: HingeBox().hinge_box(90, 90),
+        "hinge_box_standoffs": lambda: HingeBox(box_iw=50, box_il=50).hinge_box(standoffs=standoffs),
+        "hinge_box_standoffs_cutouts": lambda: HingeBox(box_iw=50, box_il=50).hinge_box(standoffs=standoffs, wall_cutouts=_slot_cutout, top_cutouts=_lid_cutout),
+        "mks_hinge_box": lambda: __import__("mks_hinge_box").mks_box(),
+        "board_case": lambda: __import__("board_case").case(export_stl=0),
+    })
+    return cases
+
+def _as_shape(result):
+    import cadquery as cq
+    if isinstance(result, cq.Assembly):
+        return result.toCompound()
+    if isinstance(result, cq.Workplane):
+        vals = [v for v in result.vals() if isinstance(v, cq.Shape)]
+        return vals[0] if len(vals) == 1 else cq.Compound.makeCompound(vals)
+    return result
+
+def _peak_rss_mb():
+    #ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+#Runs one case in this process and returns its measurements
+def run_case(name):
+    start = time.perf_counter()
+    import cadquery
+    import export
+    import_s = time.perf_counter() - start
+    build = _cases()[name]
+    rss_before = _peak_rss_mb()
+
+    start = time.perf_counter()
+    shape = _as_shape(build())
+    wall_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vertices, triangles = export.triangulate(shape, export.presets["coarse"]["tolerance"], export.presets["coarse"]["angular_tolerance"])
+    tessellate_s = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        start = time.perf_counter()
+        export.export_shapes({name: shape}, out_dir=out_dir, workers=1)
+        export_s = time.perf_counter() - start
+
+    return {
+        "case": name,
+        "wall_s": round(wall_s, 4),
+        "import_s": round(import_s, 4),
+        "tessellate_s": round(tessellate_s, 4),
+        "export_s": round(export_s, 4),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "build_rss_mb": round(_peak_rss_mb() - rss_before, 1),
+        "solids": len(shape.Solids()),
+        "faces": len(shape.Faces()),
+        "triangles": int(len(triangles)),
+        "volume": round(shape.Volume(), 3),
+    }
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+#Runs each selected case repeat times in fresh processes and keeps the fastest run
+#profile_dir writes a per-step trace for every case run (see profiling.py)
+def run_suite(names, repeat=1, profile_dir=None):
+    env = dict(os.environ, CQ_HINGE_CACHE="0")
+    results = []
+    for name in names:
+        best = None
+        for _ in range(repeat):
+            if profile_dir:
+                env["CQ_HINGE_PROFILE"] = os.path.join(os.path.abspath(profile_dir), name + ".json")
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-case", name], capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+            if proc.returncode != 0:
+                best = {"case": name, "error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "exit %d" % proc.returncode}
+                break
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            if best is None or result["wall_s"] < best["wall_s"]:
+                best = result
+        print(json.dumps(best), file=sys.stderr, flush=True)
+        results.append(best)
+    return {
+        "commit": _git_rev(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+#Prints per-case wall time ratios between two result files
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = {r["case"]: r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+    print("%-34s %10s %10s %8s" % ("case", "old_s", "new_s", "ratio"))
+    for r in new:
+        o = old.get(r["case"])
+        if o is None or "wall_s" not in o or "wall_s" not in r:
+            continue
+        print("%-34s %10.3f %10.3f %7.2fx" % (r["case"], o["wall_s"], r["wall_s"], r["wall_s"] / o["wall_s"] if o["wall_s"] else float("inf")))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark hinge, box and case generation")
+    parser.add_argument("cases", nargs="*", help="case names to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case; the fastest is reported")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--list", action="store_true", help="list case names and exit")
+    parser.add_argument("--profile", metavar="DIR", help="write a per-step JSON trace for each case into DIR")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two JSON reports")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case)))
+        return 0
+    if args.compare:
+        compare(*args.compare)
+        return 0
+    names = list(_cases())
+    if args.list:
+        print("\n".join(names))
+        return 0
+    report = run_suite(args.cases or names, args.repeat, args.profile)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 1 if any("error" in r for r in report["results"]) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import time
+import hinge
+import hinge_box
+import brep_cache
+from hinge import Hinge
+from hinge_box import HingeBox
+
+#Compares the chained pairwise boolean path against the batched multi-argument path
+cases = {
+    "hinge_3_arms": lambda **o: Hinge(n_socket_arms=3, **o).hinge(),
+    "hinge_8_arms": lambda **o: Hinge(n_socket_arms=8, **o).hinge(),
+    "hinge_box": lambda **o: HingeBox(**o).hinge_box(),
+    "hinge_box_folded": lambda **o: HingeBox(**o).hinge_box(90, 90),
+}
+
+modes = {
+    "chained": {"batch_booleans": 0, "parallel_booleans": 1},
+    "batched": {"batch_booleans": 1, "parallel_booleans": 1},
+    "batched_serial": {"batch_booleans": 1, "parallel_booleans": 0},
+}
+
+def time_case(build, opts, repeat=3):
+    best = None
+    for _ in range(repeat):
+        #Every in-process cache starts empty, so each run (and each mode) builds its own geometry
+        hinge._arm_cache.clear()
+        hinge._memo.clear()
+        hinge_box._standoff_cache.clear()
+        start = time.perf_counter()
+        build(**opts)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == "__main__":
+    brep_cache.cache.opts["enabled"] = False
+    print("%-18s" % "case" + "".join("%16s" % m for m in modes))
+    for name, build in cases.items():
+        print("%-18s" % name + "".join("%15.3fs" % time_case(build, opts) for opts in modes.values()))
@@ -1,7 +1,20 @@
-import cadquery as cq
 import math
+import os
+import components
+import export
+import lazy
+import profiling
+from booleans import cut_all
+from cutouts import cutout, cutout_tools
 
-def case(export_stl=True, show_board=False):
+cq = lazy.module("cadquery")
+
+#fidelity="preview" skips the cosmetic box and port fillets while keeping every outer dimension
+#export_opts are passed on to export.export_shapes (out_dir, format, preset, ...); the STEP file goes to the same out_dir
+def case(export_stl=True, show_board=False, fidelity="full", export_opts={}):
+    if fidelity not in ("full", "preview"):
+        raise ValueError("fidelity must be 'full' or 'preview', got %r" % (fidelity,))
+    preview = fidelity == "preview"
 
     ###
     #USER DEFINED VALUES
@@ -46,7 +59,8 @@ def case(export_stl=True, show_board=False):
     
     def base():
         b = cq.Workplane("XY").box(box_iw+wall_thick*2, box_ih+wall_thick*2, base_height, centered=[1,1,0])
-        b = b.edges("|Z").fillet(box_outer_fillet)
+        if not preview:
+            b = b.edges("|Z").fillet(box_outer_fillet)
         b = b.faces(">Z").workplane().rect(box_iw, box_ih).cutBlind(-board_thick * (1-box_height_split_lid_prop) - standoff_height)
         b = b.faces("<Z[1]").workplane().rect(board_screw_w, board_screw_h).vertices().cylinder(standoff_height, (screw_diam + 3.5)/2, centered=[1,1,0])
         b = b.faces(">Z[2]").workplane().rect(board_screw_w, board_screw_h).vertices().hole(screw_diam)
@@ -54,35 +68,38 @@ def case(export_stl=True, show_board=False):
         return b
     def lid():
         l = cq.Workplane("XY").workplane(offset=base_height).box(box_iw+wall_thick*2, box_ih+wall_thick*2, lid_height, centered=[1,1,0])
-        l = l.edges("|Z").fillet(box_outer_fillet)
+        if not preview:
+            l = l.edges("|Z").fillet(box_outer_fillet)
         l = l.faces("XY").workplane().rect(box_iw-lid_lip_clearance*2, box_ih-lid_lip_clearance*2).extrude(-lid_lip_height)
         l = l.faces("<Z").workplane().rect(box_iw-lid_lip_thick*2, box_ih-lid_lip_thick*2).cutBlind(-(lid_lip_height + lid_height - ceil_thick))
         return l
     
     def lid_cutout():
         driver_cutout_h = 26
-        l = lid()
-        l = l.faces(">Z").workplane().move(0, board_h/2 - driver_cutout_h).rect(board_w + box_inner_margin, driver_cutout_h, centered=[1,0]).cutThruAll()
-        return l
+        return cutout(">Z", lambda wp: wp.rect(board_w + box_inner_margin, driver_cutout_h, centered=[1,0]), "all", at=(0, board_h/2 - driver_cutout_h))
     
-    def usb_cutout(orig):
+    def port_profile(hole_w, hole_h):
+        sketch = cq.Sketch().rect(hole_w, hole_h)
+        if not preview:
+            sketch = sketch.vertices().fillet(2)
+        return sketch
+
+    def usb_cutout():
         hole_h = 14
         hole_w = 16
         hole_dist_from_floor = standoff_height
         hole_dist_from_left = 20
-        orig = orig.faces("<Y").workplane(origin=(0,0)).moveTo(-board_w/2 + hole_w/2 + hole_dist_from_left, floor_thick + hole_dist_from_floor + hole_h/2)\
-            .sketch().rect(hole_w, hole_h).vertices().fillet(2).finalize().cutBlind(-(wall_thick + lid_lip_thick))
-        return orig
-    def power_cutout(orig):
+        return cutout("<Y", port_profile(hole_w, hole_h), wall_thick + lid_lip_thick, origin=(0,0),
+            at=(-board_w/2 + hole_w/2 + hole_dist_from_left, floor_thick + hole_dist_from_floor + hole_h/2))
+    def power_cutout():
         hole_h = 14
         hole_w = 16
         hole_dist_from_floor = 4
         hole_dist_from_bot = 10
-        orig = orig.faces("<X").workplane(origin=(0,0)).moveTo(board_h/2 - hole_h/2 - hole_dist_from_bot, floor_thick + hole_dist_from_floor + hole_h/2)\
-            .sketch().rect(hole_w, hole_h).vertices().fillet(2).finalize().cutBlind(-(wall_thick + lid_lip_thick))
-        return orig
-    def cutouts(orig):
-        return power_cutout(usb_cutout(orig))
+        return cutout("<X", port_profile(hole_w, hole_h), wall_thick + lid_lip_thick, origin=(0,0),
+            at=(board_h/2 - hole_h/2 - hole_dist_from_bot, floor_thick + hole_dist_from_floor + hole_h/2))
+    def cutouts():
+        return [usb_cutout(), power_cutout()]
 
     def snap_clip():
         return cq.Sketch().polygon([
@@ -109,36 +126,52 @@ def case(export_stl=True, show_board=False):
         place_clip("<Y[1]")
         return l
 
-    def base_clip_detent(b):
-        def place_detent(face_sel_str):
-            nonlocal b
-            b = b.faces(face_sel_str).workplane(origin=(0,0,base_height-lid_lip_height-hook_ledge_depth-0.8))\
-                .sketch().rect(hook_width+2, 2).finalize().cutBlind(-hook_point_depth)
-        place_detent(">X[-2]")
-        place_detent("<X[-2]")
-        place_detent(">Y[-2]")
-        place_detent("<Y[-2]")
-        return b
+    def base_clip_detents():
+        def detent(face_sel_str):
+            return cutout(face_sel_str, cq.Sketch().rect(hook_width+2, 2), hook_point_depth, origin=(0,0,base_height-lid_lip_height-hook_ledge_depth-0.8))
+        return [detent(">X[-2]"), detent("<X[-2]"), detent(">Y[-2]"), detent("<Y[-2]")]
 
-    b = cutouts(base_clip_detent(base()))
-    l = cutouts(lid_clips(lid_cutout()))
+    #Every opening in a part is declared as a cutout spec and the part takes all of them in one cut
+    def cut_openings(part, specs):
+        return cut_all(part, cutout_tools(part, specs), 1, 1, preview)
 
-    display_lid_z_offset = 0
-    a = cq.Assembly()\
-        .add(b, loc =cq.Location(cq.Vector(0, 0, 0)), color=cq.Color(1,0,0,0.5), name="Base")\
-        .add(l, loc =cq.Location(cq.Vector(0, 0, display_lid_z_offset)), color=cq.Color(0,0,1,0.5), name="Lid") 
+    #Each feature step is a named profiling step, so a trace shows where a slow case build spends its time
+    def traced(name, fn, *args):
+        with profiling.step("board_case." + name):
+            return profiling.result(fn(*args))
 
-    if(export_stl):
-        cq.exporters.export(b, "stl/base.stl")
-        cq.exporters.export(l, "stl/lid.stl")
-        a.save("stl/case.step")
+    with profiling.step("board_case"):
+        b = traced("base", base)
+        b = traced("base_cutouts", cut_openings, b, base_clip_detents() + cutouts())
+        l = traced("lid", lid)
+        l = traced("lid_clips", lid_clips, l)
+        l = traced("lid_cutouts", cut_openings, l, [lid_cutout()] + cutouts())
 
+        display_lid_z_offset = 0
+        a = cq.Assembly()\
+            .add(b, loc =cq.Location(cq.Vector(0, 0, 0)), color=cq.Color(1,0,0,0.5), name="Base")\
+            .add(l, loc =cq.Location(cq.Vector(0, 0, display_lid_z_offset)), color=cq.Color(0,0,1,0.5), name="Lid") 
+
+        if(export_stl):
+            with profiling.step("board_case.export"):
+                export.export_shapes({"base": b, "lid": l}, **export_opts)
+                a.save(os.path.join(export_opts.get("out_dir", export.default_opts["out_dir"]), "case.step"))
+
+    #show_board="proxy" shows the board's bounding box instead of the full model
     if(show_board):
-        pcb = cq.importers.importStep("../mks_gen_l_1.step")\
-            .rotateAboutCenter((1,0,0), 90).translate((-7,-1.5, floor_thick+standoff_height+3)).rotateAboutCenter((0,0,1), 180)
+        pcb = components.reference("../mks_gen_l_1.step", [
+            ("rotateAboutCenter", (1,0,0), 90),
+            ("translate", (-7,-1.5, floor_thick+standoff_height+3)),
+            ("rotateAboutCenter", (0,0,1), 180),
+        ], proxy=show_board == "proxy")
         show_object(pcb)
 
     return a
 
-c = case(export_stl=0, show_board=1)
-show_object(c)
+if __name__ == "__main__":
+    case(export_stl=True)
+
+#Only build the demo when run inside CQ-editor, so importing this module stays free of side effects
+if "show_object" in globals():
+    c = case(export_stl=0, show_board=1)
+    show_object(c)
@@ -0,0 +1,32 @@
+import lazy
+
+cq = lazy.module("cadquery")
+
+def _shape(obj):
+    if isinstance(obj, cq.Workplane):
+        return obj.findSolid()
+    return obj
+
+#batch runs one OCC boolean with every tool at once, otherwise falls back to the classic chain of pairwise booleans
+#preview skips the face-merging clean() pass, which only tidies topology
+def _apply(wp, tools, op, batch, parallel, preview):
+    from OCP.BRepAlgoAPI import BRepAlgoAPI_Fuse, BRepAlgoAPI_Cut
+    op_type = BRepAlgoAPI_Fuse if op == "fuse" else BRepAlgoAPI_Cut
+    tools = [_shape(t) for t in tools]
+    groups = [tools] if batch else [[t] for t in tools]
+    for group in groups:
+        if not group:
+            continue
+        base = wp.findSolid()
+        result = base._bool_op([base], group, op_type(), parallel=bool(parallel))
+        wp = wp.newObject([result if preview else result.clean()])
+    return wp
+
+#preview only groups the pieces into a compound: overlapping solids look the same in a viewer and need no boolean
+def fuse_all(wp, tools, batch=1, parallel=1, preview=0):
+    if preview and tools:
+        return wp.newObject([cq.Compound.makeCompound([wp.findSolid()] + [_shape(t) for t in tools])])
+    return _apply(wp, tools, "fuse", batch, parallel, preview)
+
+def cut_all(wp, tools, batch=1, parallel=1, preview=0):
+    return _apply(wp, tools, "cut", batch, parallel, preview)
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import sysconfig
+import uuid
+import lazy
+
+cq = lazy.module("cadquery")
+
+log = logging.getLogger(__name__)
+
+#Bump when generated geometry changes in a way the module source hash cannot see (e.g. a CadQuery upgrade)
+GEOMETRY_VERSION = 1
+
+default_opts = {
+    "enabled": os.environ.get("CQ_HINGE_CACHE", "1") != "0",
+    "path": os.environ.get("CQ_HINGE_CACHE_DIR", os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "cq_hinge")),
+    "max_mb": float(os.environ.get("CQ_HINGE_CACHE_MAX_MB", 512)),
+    "evict_every": 16, #stores between size checks; each check lists the whole cache directory
+}
+
+#Raised by normalize for values that have no stable hash; cached() builds them without touching the cache
+class Unhashable(Exception):
+    pass
+
+def _code_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if hasattr(const, "co_names"):
+            names |= _code_names(const)
+    return names
+
+def _is_data(val):
+    return val is None or isinstance(val, (bool, int, float, str, tuple, list, dict))
+
+def _brep_hash(shape):
+    import io
+    f = io.BytesIO()
+    shape.exportBrep(f)
+    return hashlib.sha256(f.getvalue()).hexdigest()
+
+#Installed packages and the standard library; their code is pinned by the CadQuery version in the key rather than hashed
+_library_paths = tuple(sorted({os.path.abspath(p) + os.sep for p in (sysconfig.get_paths()["stdlib"], sysconfig.get_paths()["purelib"], sysconfig.get_paths()["platlib"])}))
+
+def _module_of(val):
+    import inspect
+    if inspect.ismodule(val):
+        return val
+    owner = val if inspect.isclass(val) or inspect.isroutine(val) else type(val)
+    mod = sys.modules.get(getattr(owner, "__module__", None) or "")
+    if mod is None:
+        raise Unhashable("no module for %r" % (val,))
+    return mod
+
+def _is_library(val):
+    mod = _module_of(val)
+    path = getattr(mod, "__file__", None)
+    if path is None:
+        return mod.__name__ in sys.builtin_module_names
+    return os.path.abspath(path).startswith(_library_paths)
+
+def _qualname(val):
+    import inspect
+    if inspect.ismodule(val):
+        return val.__name__
+    owner = val if inspect.isclass(val) or inspect.isroutine(val) else type(val)
+    return "%s.%s" % (getattr(owner, "__module__", None), getattr(owner, "__qualname__", repr(owner)))
+
+#Hashes a global a callable reads, or an attribute it reads off one (helpers.slot, cfg.W)
+#Plain values and functions hash like options, project classes by source and members, modules and objects by the attributes named in the callable's code, library code by name
+def _reference(val, names, _seen):
+    import inspect
+    if _is_data(val) or inspect.isfunction(val) or inspect.ismethod(val) or type(val).__module__.startswith("cadquery."):
+        return normalize(val, _seen)
+    if _is_library(val):
+        return _qualname(val) if inspect.ismodule(val) or inspect.isclass(val) or inspect.isroutine(val) else normalize(val, _seen)
+    if id(val) in _seen:
+        return _qualname(val)
+    _seen.add(id(val))
+    if inspect.isclass(val):
+        try:
+            src = inspect.getsource(val)
+        except (OSError, TypeError):
+            raise Unhashable("no source for %s" % _qualname(val))
+        members = {}
+        for key, member in sorted(vars(val).items()):
+            member = getattr(member, "__func__", getattr(member, "fget", member))
+            if inspect.isfunction(member) or (_is_data(member) and not key.startswith("__")):
+                members[key] = normalize(member, _seen)
+        return {"class": _qualname(val), "source": hashlib.sha256(src.encode()).hexdigest(), "bases": [_reference(b, names, _seen) for b in val.__bases__], "members": members}
+    attrs = {attr: _reference(getattr(val, attr), names, _seen) for attr in sorted(names) if hasattr(val, attr)}
+    if inspect.ismodule(val):
+        return {"module": val.__name__, "attrs": attrs}
+    return {"type": _reference(type(val), names, _seen), "attrs": attrs}
+
+#Turns option values into something stable to hash
+#Callables hash by source, closure cells, defaults and every global they read (see _reference), so a helper changed in another module changes the key
+#Shapes and sketches hash by their B-rep; anything whose only description is its memory address raises Unhashable
+def normalize(val, _seen=None):
+    import inspect
+    if _seen is None:
+        _seen = set()
+    if isinstance(val, bool) or val is None or isinstance(val, (int, str)):
+        return val
+    if isinstance(val, float):
+        return round(val, 9)
+    if isinstance(val, dict):
+        return {str(k): normalize(v, _seen) for k, v in sorted(val.items())}
+    if isinstance(val, (list, tuple)):
+        return [normalize(v, _seen) for v in val]
+    if type(val).__module__.startswith("cadquery."):
+        if isinstance(val, cq.Shape):
+            return {"brep": _brep_hash(val)}
+        if isinstance(val, cq.Sketch):
+            return {"sketch": _brep_hash(val._faces), "edges": [_brep_hash(e) for e in val._edges], "locs": [normalize(loc, _seen) for loc in val.locs]}
+        if isinstance(val, (cq.Location, cq.Vector)):
+            return normalize(val.toTuple(), _seen)
+    if callable(val) and hasattr(val, "__code__"):
+        name = getattr(val, "__module__", "") + "." + getattr(val, "__qualname__", repr(val))
+        #Keyed by identity: closures made by one factory share a name but not their captured values
+        if id(val) in _seen:
+            return name
+        _seen.add(id(val))
+        try:
+            src = inspect.getsource(val)
+        except (OSError, TypeError):
+            src = repr(val.__code__.co_code)
+        names = _code_names(val.__code__)
+        refs = {}
+        for ref in sorted(names):
+            if ref not in val.__globals__:
+                continue
+            refs[ref] = _reference(val.__globals__[ref], names, _seen)
+        closure = []
+        for cell in val.__closure__ or ():
+            try:
+                closure.append(normalize(cell.cell_contents, _seen))
+            except ValueError:
+                closure.append(None)
+        return {
+            "callable": name,
+            "source": hashlib.sha256(src.encode()).hexdigest(),
+            "refs": refs,
+            "closure": closure,
+            "defaults": normalize(val.__defaults__ or (), _seen),
+            "kwdefaults": normalize(val.__kwdefaults__ or {}, _seen),
+            "self": normalize(val.__self__, _seen) if inspect.ismethod(val) else None,
+        }
+    text = repr(val)
+    if " at 0x" in text:
+        raise Unhashable("no stable hash for %s" % text)
+    return text
+
+#Hash of the source of the modules whose code produces the cached geometry
+def code_version(*module_names):
+    h = hashlib.sha256(str(GEOMETRY_VERSION).encode())
+    h.update(cq.__version__.encode())
+    for name in module_names:
+        with open(sys.modules[name].__file__, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+class BrepCache:
+    def __init__(self, **args):
+        self.opts = default_opts.copy()
+        for key, val in args.items():
+            if key in self.opts:
+                self.opts[key] = val
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+
+    def key(self, kind, opts, args, modules):
+        payload = {"kind": kind, "opts": normalize(opts), "args": normalize(args), "code": code_version(*modules)}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.opts["path"], key)
+
+    #Returns {name: cq.Shape} for a cached entry or None, marking the entry as recently used
+    def get(self, key):
+        path = self.entry_path(key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            shapes = {}
+            for fname in os.listdir(path):
+                if fname.endswith(".brep"):
+                    shapes[fname[:-5]] = cq.Shape.importBrep(os.path.join(path, fname))
+            os.utime(path)
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        return shapes
+
+    #Writes every shape as <name>.brep into a temporary directory then renames it into place so readers never see half an entry
+    #The cache is only an accelerator: a failed write is logged and the build carries on
+    def put(self, key, shapes):
+        tmp = os.path.join(self.opts["path"], ".tmp-" + uuid.uuid4().hex)
+        try:
+            os.makedirs(tmp)
+            for name, shape in shapes.items():
+                if not shape.exportBrep(os.path.join(tmp, name + ".brep")):
+                    raise OSError("could not write %s.brep" % name)
+            try:
+                os.rename(tmp, self.entry_path(key))
+            except OSError:
+                #Another process stored the same entry first
+                shutil.rmtree(tmp, ignore_errors=True)
+        except OSError as e:
+            log.warning("BREP cache write to %s failed: %s", self.opts["path"], e)
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self.puts += 1
+        if (self.puts - 1) % self.opts["evict_every"] == 0:
+            self.evict()
+
+    #Drops least recently used entries until the cache fits in max_mb
+    #Other processes may be adding or evicting entries at the same time, so entries that vanish mid-scan are skipped
+    def evict(self):
+        root = self.opts["path"]
+        entries = []
+        total = 0
+        try:
+            names = os.listdir(root)
+        except OSError as e:
+            log.warning("BREP cache eviction in %s failed: %s", root, e)
+            return
+        for name in names:
+            path = os.path.join(root, name)
+            if name.startswith("."):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, path))
+            except OSError:
+                continue
+            total += size
+        entries.sort()
+        max_bytes = self.opts["max_mb"] * 1024 * 1024
+        while entries and total > max_bytes:
+            _, size, path = entries.pop(0)
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.opts["path"], ignore_errors=True)
+
+    #Loads shapes for (kind, opts, args) from disk, or calls build() -> {name: cq.Shape} and stores the result
+    def cached(self, kind, opts, args, build, modules=()):
+        if not self.opts["enabled"]:
+            return build()
+        try:
+            key = self.key(kind, opts, args, modules)
+        except Unhashable:
+            return build()
+        shapes = self.get(key)
+        if shapes is not None:
+            self.hits += 1
+            return shapes
+        self.misses += 1
+        shapes = build()
+        self.put(key, shapes)
+        return shapes
+
+cache = BrepCache()
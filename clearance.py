@@ -0,0 +1,208 @@
+import argparse
+import json
+import sys
+from hinge import Hinge
+import export
+import lazy
+
+cq = lazy.module("cadquery")
+np = lazy.module("numpy")
+
+#Checks ball/socket and arm clearances of a hinge over many fold angles without rebuilding it
+#Both halves are tessellated once and sampled densely; the socket half stays put while the ball half's samples are rotated about the fold axis for every angle in one batched NumPy pass
+#Distances are measured between surface samples, so results are good to about tolerance + spacing
+#Samples that look inside the socket half by their nearest socket sample's normal are confirmed with an exact OCC point classification
+
+default_opts = {
+    "tolerance": 0.02, #linear deflection used to tessellate the halves
+    "angular_tolerance": 0.2,
+    "spacing": 0.25, #largest gap between surface samples
+    "max_distance": 0.5, #clearances above this are reported as max_distance
+    "chunk": 2000000, #sample placements queried per batch, bounds memory use
+}
+
+#Samples a mesh so that no point of its surface is far more than spacing from a sample
+#Samples are the mesh vertices (with area-weighted normals), points every spacing along triangle edges, and interior points in proportion to triangle area
+#Interior points come from a fixed seed so repeated runs sample identically
+#Returns (points, outward unit normals), one normal per sample
+def surface_samples(vertices, triangles, spacing):
+    vertices = vertices.astype(np.float64)
+    tri = vertices[triangles]
+    a, b, c = tri[:, 0], tri[:, 1], tri[:, 2]
+    n = np.cross(b - a, c - a)
+    #Meshes from export.triangulate are wound outward, but flip them if the signed volume says otherwise
+    if np.einsum("ij,ij->i", a, n).sum() < 0:
+        n = -n
+    vertex_normals = np.zeros_like(vertices)
+    for corner in range(3):
+        np.add.at(vertex_normals, triangles[:, corner], n)
+    length = np.linalg.norm(vertex_normals, axis=1)
+    used = length > 0
+    points = [vertices[used]]
+    point_normals = [vertex_normals[used] / length[used, None]]
+
+    area2 = np.linalg.norm(n, axis=1)
+    keep = area2 > 1e-12
+    a, b, c, area2 = a[keep], b[keep], c[keep], area2[keep]
+    normals = n[keep] / area2[:, None]
+
+    starts = np.concatenate([a, b, c])
+    ends = np.concatenate([b, c, a])
+    edge_normals = np.concatenate([normals, normals, normals])
+    count = np.ceil(np.linalg.norm(ends - starts, axis=1) / spacing).astype(int) - 1
+    edge = np.repeat(np.arange(len(count)), np.maximum(count, 0))
+    step = np.arange(len(edge)) - np.repeat(np.cumsum(np.maximum(count, 0)) - np.maximum(count, 0), np.maximum(count, 0)) + 1
+    t = (step / (count[edge] + 1))[:, None]
+    points.append(starts[edge] * (1 - t) + ends[edge] * t)
+    point_normals.append(edge_normals[edge])
+
+    count = np.floor(area2 / 2 / spacing**2).astype(int)
+    face = np.repeat(np.arange(len(count)), count)
+    r1, r2 = np.random.default_rng(0).random((2, len(face)))
+    r1 = np.sqrt(r1)[:, None]
+    r2 = r2[:, None]
+    points.append(a[face] * (1 - r1) + b[face] * (r1 * (1 - r2)) + c[face] * (r1 * r2))
+    point_normals.append(normals[face])
+    return np.concatenate(points), np.concatenate(point_normals)
+
+#Rotation matrices for -angle about +Y, the fold direction used by Hinge.hinge_parts
+def fold_rotations(angles):
+    t = np.radians(-np.asarray(angles, dtype=np.float64))
+    c, s = np.cos(t), np.sin(t)
+    r = np.zeros((len(t), 3, 3))
+    r[:, 0, 0] = c
+    r[:, 0, 2] = s
+    r[:, 1, 1] = 1
+    r[:, 2, 0] = -s
+    r[:, 2, 2] = c
+    return r
+
+#Tessellates and samples both halves of hinge, placed as in the folded Hinge.hinge() frame with the fold axis at x=0, z=ball_socket_z
+#Returns the ball half samples relative to the fold axis and the placed socket half samples with their normals
+def hinge_samples(hinge, **args):
+    opts = default_opts.copy()
+    for key, val in args.items():
+        if key in opts:
+            opts[key] = val
+    parts = hinge.hinge_parts()
+    axis = np.array([0, 0, hinge.ball_socket_z])
+
+    vertices, triangles = export.triangulate(parts["ball_hinge"].findSolid(), opts["tolerance"], opts["angular_tolerance"])
+    ball, _ = surface_samples(vertices, triangles, opts["spacing"])
+    ball = ball - np.array([hinge.ball_socket_x, 0, 0]) - axis
+
+    vertices, triangles = export.triangulate(parts["socket_hinge"].findSolid(), opts["tolerance"], opts["angular_tolerance"])
+    socket, socket_normals = surface_samples(vertices, triangles, opts["spacing"])
+    #Socket half is turned 180 degrees about Z and moved to +ball_socket_x
+    flip = np.array([-1, -1, 1])
+    socket = socket * flip + np.array([hinge.ball_socket_x, 0, 0])
+    socket_normals = socket_normals * flip
+    socket_solid = parts["socket_hinge"].findSolid().moved(cq.Location(cq.Vector(hinge.ball_socket_x, 0, 0), cq.Vector(0, 0, 1), 180))
+    return {"ball": ball, "axis": axis, "socket": socket, "socket_normals": socket_normals, "socket_solid": socket_solid}
+
+#Signed clearance between the ball and socket halves for every fold angle
+#Positive values are the smallest gap between the halves; negative values are the deepest penetration of the ball half into the socket half
+#Returns a dict of per-angle arrays plus the first interfering angle (None when every angle is clear)
+def clearance_curve(hinge, angles, **args):
+    from OCP.BRepClass3d import BRepClass3d_SolidClassifier
+    from OCP.gp import gp_Pnt
+    from OCP.TopAbs import TopAbs_IN
+    from scipy.spatial import cKDTree
+    opts = default_opts.copy()
+    for key, val in args.items():
+        if key in opts:
+            opts[key] = val
+    angles = np.asarray(angles, dtype=np.float64)
+    max_distance = float(opts["max_distance"])
+    s = hinge_samples(hinge, **opts)
+    tree = cKDTree(s["socket"])
+
+    #Folding keeps each sample's distance from the fold axis and its y, so ball samples with no socket sample nearby in (radius, y) can never come within max_distance
+    def radius_y(p):
+        p = p - s["axis"]
+        return np.stack([np.hypot(p[:, 0], p[:, 2]), p[:, 1]], axis=1)
+    ball = s["ball"]
+    reach = cKDTree(radius_y(s["socket"])).query(radius_y(ball + s["axis"]), distance_upper_bound=max_distance)[0]
+    ball = ball[np.isfinite(reach)]
+
+    classifier = BRepClass3d_SolidClassifier(s["socket_solid"].wrapped)
+    def is_inside(p):
+        classifier.Perform(gp_Pnt(*p), 1e-6)
+        return classifier.State() == TopAbs_IN
+
+    clearance = np.full(len(angles), max_distance)
+    penetration = np.zeros(len(angles))
+    closest = np.full((len(angles), 3), np.nan)
+    per_chunk = max(1, opts["chunk"] // max(len(ball), 1))
+    for start in range(0, len(angles), per_chunk):
+        rot = fold_rotations(angles[start:start + per_chunk])
+        placed = np.einsum("aij,nj->ani", rot, ball) + s["axis"]
+        dist, idx = tree.query(placed.reshape(-1, 3), distance_upper_bound=max_distance, workers=-1)
+        dist = dist.reshape(len(rot), len(ball))
+        near = np.isfinite(dist)
+        dist = np.where(near, dist, max_distance)
+        idx = np.where(near, idx.reshape(len(rot), len(ball)), 0)
+        #A sample is a candidate when it sits mostly behind the nearest socket face; samples beside a face's edge fail this and stay clear
+        side = np.einsum("ani,ani->an", placed - s["socket"][idx], s["socket_normals"][idx])
+        candidates = near & (side < -0.5 * dist)
+        for row in range(len(rot)):
+            a = start + row
+            best = np.argmin(dist[row])
+            clearance[a] = dist[row, best]
+            closest[a] = placed[row, best] if near[row, best] else np.nan
+            #Only the deepest confirmed sample matters, so classify candidates deepest first and stop at the first one inside
+            cand = np.nonzero(candidates[row])[0]
+            for n in cand[np.argsort(-dist[row, cand])]:
+                if is_inside(placed[row, n]):
+                    penetration[a] = dist[row, n]
+                    clearance[a] = -dist[row, n]
+                    closest[a] = placed[row, n]
+                    break
+
+    interfering = np.nonzero(penetration > 0)[0]
+    return {
+        "angles": angles,
+        "clearance": clearance,
+        "penetration": penetration,
+        "closest_point": closest,
+        "first_interference": float(angles[interfering[0]]) if len(interfering) else None,
+        "resolution": opts["tolerance"] + opts["spacing"],
+        "samples": {"ball": len(ball), "socket": len(s["socket"])},
+    }
+
+def _angle_range(text):
+    start, stop, step = (float(v) for v in text.split(":"))
+    return np.arange(start, stop + step / 2, step)
+
+def _opt_value(text):
+    key, val = text.split("=", 1)
+    return key, json.loads(val)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-angle ball/socket clearance curve for a hinge")
+    parser.add_argument("--angles", type=_angle_range, default=_angle_range("0:180:5"), help="start:stop:step in degrees (default 0:180:5)")
+    parser.add_argument("--opt", type=_opt_value, action="append", default=[], metavar="KEY=VALUE", help="Hinge option, e.g. socket_ball_clearance=0.1")
+    parser.add_argument("--hinge-w", type=float, help="size the arms with Hinge.fixed_width for this width")
+    parser.add_argument("--spacing", type=float, default=default_opts["spacing"])
+    parser.add_argument("--tolerance", type=float, default=default_opts["tolerance"])
+    parser.add_argument("--json", action="store_true", help="print the curve as JSON")
+    args = parser.parse_args(argv)
+
+    opts = dict(args.opt)
+    hinge = Hinge(**opts)
+    if args.hinge_w:
+        #Only resolves the arm widths; clearance_curve builds the halves itself
+        widths = {key: opts.pop(key) for key in ("n_socket_arms", "arm_w_ratio", "interarm_clearance") if key in opts}
+        hinge.fixed_width(args.hinge_w, **widths, **opts)
+    result = clearance_curve(hinge, args.angles, spacing=args.spacing, tolerance=args.tolerance)
+    if args.json:
+        print(json.dumps({key: val.tolist() if isinstance(val, np.ndarray) else val for key, val in result.items()}))
+    else:
+        print("%8s %10s %12s" % ("angle", "clearance", "penetration"))
+        for i, angle in enumerate(result["angles"]):
+            print("%8g %10.3f %12.3f" % (angle, result["clearance"][i], result["penetration"][i]))
+        print("first interference: %s (resolution %.2f mm)" % (result["first_interference"], result["resolution"]))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import argparse
+import json
+import sys
+
+import batch
+import dimensions
+import export
+import hinge
+import hinge_box
+
+#Command-line entry points for the scripts' builds, so nothing is built at import time
+#Options are KEY=VALUE pairs, parsed as JSON when possible, using the same names as batch.py table columns:
+#    python cli.py build hinge folded_angle=90 hinge_w=40
+#    python cli.py build hinge_box wall_angle=90 ceil_angle=90 --format 3mf
+#    python cli.py check hinge_box box_il=10
+#    python cli.py mks_box
+#check and dims only do option math and return in milliseconds, before CadQuery is ever imported
+
+def _pair(text):
+    key, sep, val = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError("expected KEY=VALUE, got %r" % text)
+    try:
+        return key, json.loads(val)
+    except ValueError:
+        return key, val
+
+def _row(args):
+    return dict(args.options, kind=args.kind, name=args.name or args.kind)
+
+def build(args):
+    row = _row(args)
+    _, problems = batch.check_row(0, row, args.clamp)
+    if problems:
+        print("\n".join(problems), file=sys.stderr)
+        return 1
+    print(json.dumps(batch.build_row(0, batch.check_row(0, row, args.clamp)[0], args.out, {"format": args.format, "preset": args.preset})))
+    return 0
+
+def check(args):
+    _, problems = batch.check_row(0, _row(args), args.clamp)
+    print("\n".join(problems) if problems else "ok")
+    return 1 if problems else 0
+
+#Prints every derived dimension of a feasible option set as JSON
+def dims(args):
+    name, kind, opts, method_args = batch.parse_row(0, _row(args))
+    if kind == "hinge_box":
+        _, d = dimensions.validate_hinge_box(dimensions.merged(hinge_box.default_opts, opts), hinge.default_opts, method_args.get("screw_closure", 1), args.clamp)
+    else:
+        o = dimensions.merged(hinge.default_opts, opts)
+        if "hinge_w" in method_args:
+            socket_arm_w, ball_arm_w = dimensions.fixed_width_arms(method_args["hinge_w"], o["n_socket_arms"], method_args.get("arm_w_ratio", 0.5))
+            o.update(socket_arm_w=socket_arm_w, ball_arm_w=ball_arm_w)
+        o, d = dimensions.validate_hinge(o, args.clamp)
+        d = dict(d, socket_arm_w=o["socket_arm_w"], ball_arm_w=o["ball_arm_w"])
+    print(json.dumps(d, indent=2))
+    return 0
+
+def mks_box(args):
+    import mks_hinge_box
+    print(json.dumps(export.export_shapes({"mks_hinged_box": mks_hinge_box.mks_box(**args.options)}, out_dir=args.out, format=args.format, preset=args.preset)))
+    return 0
+
+def board_case(args):
+    import board_case
+    board_case.case(export_stl=True, export_opts={"out_dir": args.out, "format": args.format, "preset": args.preset}, **args.options)
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build, export and check hinges and hinge boxes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, fn, kinds in (("build", build, True), ("check", check, True), ("dims", dims, True), ("mks_box", mks_box, False), ("board_case", board_case, False)):
+        p = sub.add_parser(name)
+        p.set_defaults(fn=fn)
+        if kinds:
+            p.add_argument("kind", choices=["hinge", "hinge_box"])
+            p.add_argument("--name", help="output file name (default: the kind)")
+            p.add_argument("--clamp", action="store_true", help="clamp out-of-range hinge chamfers and fillets")
+        p.add_argument("options", nargs="*", type=_pair, metavar="KEY=VALUE")
+        p.add_argument("--out", default=export.default_opts["out_dir"], help="output directory")
+        p.add_argument("--format", default="stl", choices=["stl", "3mf"])
+        p.add_argument("--preset", default="coarse", choices=sorted(export.presets))
+    args = parser.parse_args(argv)
+    args.options = dict(args.options)
+    try:
+        return args.fn(args)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
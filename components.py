@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+
+import brep_cache
+import lazy
+
+cq = lazy.module("cadquery")
+
+#Reference components (boards, modules) imported from STEP to check an enclosure's fit
+#Parsing a detailed STEP model and transforming it can take longer than building the enclosure, so the placed shape is stored as BREP keyed by the file's hash and the transforms
+#proxy=True swaps the model for its bounding box plus keep-out boxes: booleans against it are instant and it never needs the STEP model again once cached
+#
+#    board = components.reference("mks_gen_l_1.step", [("rotateAboutCenter", (1,0,0), 90), ("translate", (-7,-1.5,8))])
+#    components.interference(case_base, board)
+
+#Placed shapes keyed by file hash, transforms and proxy options, so a session only loads each reference once
+_references = {}
+#File hashes keyed by (path, size, mtime)
+_digests = {}
+
+def file_hash(path):
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if key not in _digests:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        _digests[key] = h.hexdigest()
+    return _digests[key]
+
+#Applies ("method", *args) steps as Workplane calls, e.g. ("translate", (0, 0, 5)) or ("rotateAboutCenter", (1, 0, 0), 90)
+def apply_transforms(wp, transforms):
+    for method, *args in transforms:
+        wp = getattr(wp, method)(*args)
+    return wp
+
+def _placed(path, digest, transforms):
+    def build():
+        wp = apply_transforms(cq.importers.importStep(path), transforms)
+        return {"shape": cq.Compound.makeCompound(wp.vals())}
+    return brep_cache.cache.cached("step", {"sha256": digest}, {"transforms": transforms}, build, modules=("components",))["shape"]
+
+#Box over the placed shape's bounds plus one box per keep-out; keep-outs are ((xmin, ymin, zmin), (xmax, ymax, zmax)) in placed coordinates
+def _proxy(path, digest, transforms, keepouts):
+    def build():
+        bbox = _placed(path, digest, transforms).BoundingBox()
+        boxes = [((bbox.xmin, bbox.ymin, bbox.zmin), (bbox.xmax, bbox.ymax, bbox.zmax))] + [tuple(k) for k in keepouts]
+        return {"shape": cq.Compound.makeCompound([cq.Solid.makeBox(hi[0]-lo[0], hi[1]-lo[1], hi[2]-lo[2], pnt=cq.Vector(*lo)) for lo, hi in boxes])}
+    return brep_cache.cache.cached("step_proxy", {"sha256": digest}, {"transforms": transforms, "keepouts": keepouts}, build, modules=("components",))["shape"]
+
+#Returns the STEP model at path, placed by transforms, as a Workplane; proxy=True returns its envelope proxy instead
+def reference(path, transforms=(), proxy=False, keepouts=()):
+    digest = file_hash(path)
+    transforms = [list(t) for t in transforms]
+    keepouts = [list(k) for k in keepouts]
+    key = json.dumps(brep_cache.normalize([digest, transforms, proxy, keepouts if proxy else []]))
+    if key not in _references:
+        _references[key] = _proxy(path, digest, transforms, keepouts) if proxy else _placed(path, digest, transforms)
+    return cq.Workplane("XY").newObject([_references[key]])
+
+#Volume shared by a part and a reference component; zero means the component fits
+def interference(part, component):
+    part = part.val() if isinstance(part, cq.Workplane) else part
+    component = component.val() if isinstance(component, cq.Workplane) else component
+    return part.intersect(component).Volume()
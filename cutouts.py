@@ -0,0 +1,34 @@
+import lazy
+
+cq = lazy.module("cadquery")
+
+#A cutout is declared as data: the face it opens, a 2D profile and how deep it goes
+#Tools for every cutout are made against the uncut solid and subtracted together, so each port costs one tool extrusion instead of a face selection and a boolean on the growing solid
+
+#face: face selector on the solid, e.g. "<X"
+#profile: a cq.Sketch, or a function taking the positioned workplane and returning it with pending wires (e.g. lambda wp: wp.rect(10, 4))
+#depth: distance cut into the solid from the face, or "all" to cut through everything like cutThruAll
+#at: profile position on the face workplane; origin: workplane origin, as in Workplane.workplane(origin=...)
+def cutout(face, profile, depth, at=(0, 0), origin=(0, 0, 0)):
+    return {"face": face, "profile": profile, "depth": depth, "at": at, "origin": origin}
+
+#Builds one tool solid per spec; face selection and workplane setup are shared by specs on the same face and origin
+def cutout_tools(wp, specs):
+    planes = {}
+    tools = []
+    thru = None
+    for spec in specs:
+        key = (spec["face"], tuple(spec["origin"]))
+        if key not in planes:
+            planes[key] = wp.faces(spec["face"]).workplane(origin=spec["origin"])
+        plane = planes[key].moveTo(*spec["at"])
+        profile = spec["profile"]
+        plane = plane.placeSketch(profile) if isinstance(profile, cq.Sketch) else profile(plane)
+        if spec["depth"] == "all":
+            if thru is None:
+                thru = wp.findSolid().BoundingBox().DiagonalLength
+            tool = plane.extrude(thru, both=True, combine=False)
+        else:
+            tool = plane.extrude(-spec["depth"], combine=False)
+        tools.append(tool.findSolid())
+    return tools
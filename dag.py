@@ -0,0 +1,77 @@
+import io
+
+import lazy
+
+cq = lazy.module("cadquery")
+
+#Runs a small graph of build tasks, starting each one as soon as the tasks it depends on are done
+#tasks: {name: (fn, args, deps)}; the task calls fn(*args, *[result of each dep]) and its result is stored under name
+#With workers the tasks run in worker processes and shapes cross process boundaries as BREP, so fn and args must be picklable
+#Without workers the same graph runs in this process in dependency order, which keeps in-process caches warm and results identical
+
+#Shapes and workplanes become BREP bytes; containers are walked, anything else is passed through as is
+def dumps(val):
+    if isinstance(val, cq.Workplane):
+        return {"__workplane__": [dumps(v) for v in val.vals()]}
+    if isinstance(val, cq.Shape):
+        f = io.BytesIO()
+        val.exportBrep(f)
+        return {"__brep__": f.getvalue()}
+    if isinstance(val, dict):
+        return {key: dumps(v) for key, v in val.items()}
+    if isinstance(val, (list, tuple)):
+        return type(val)(dumps(v) for v in val)
+    return val
+
+def loads(val):
+    if isinstance(val, dict):
+        if "__workplane__" in val:
+            return cq.Workplane("XY").newObject([loads(v) for v in val["__workplane__"]])
+        if "__brep__" in val:
+            return cq.Shape.importBrep(io.BytesIO(val["__brep__"]))
+        return {key: loads(v) for key, v in val.items()}
+    if isinstance(val, (list, tuple)):
+        return type(val)(loads(v) for v in val)
+    return val
+
+def _call(fn, args, deps):
+    return dumps(fn(*loads(args), *loads(deps)))
+
+def _ready(pending, done):
+    return [name for name, (_, _, deps) in pending.items() if all(dep in done for dep in deps)]
+
+#Returns {name: result} for every task; raises ValueError for unknown dependencies or cycles
+def run(tasks, workers=0):
+    for name, (_, _, deps) in tasks.items():
+        for dep in deps:
+            if dep not in tasks:
+                raise ValueError("task %r depends on unknown task %r" % (name, dep))
+    pending = dict(tasks)
+    done = {}
+
+    if not workers:
+        while pending:
+            ready = _ready(pending, done)
+            if not ready:
+                raise ValueError("task graph has a cycle through %s" % ", ".join(sorted(pending)))
+            for name in ready:
+                fn, args, deps = pending.pop(name)
+                done[name] = fn(*args, *[done[dep] for dep in deps])
+        return done
+
+    import multiprocessing
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    #Results stay serialized until every task has finished, so dependents get the worker's bytes as they are
+    running = {}
+    #spawn, not fork: a forked child of a process whose OCC thread pool already ran parallel booleans can deadlock in its own
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        while pending or running:
+            for name in _ready(pending, done):
+                fn, args, deps = pending.pop(name)
+                running[pool.submit(_call, fn, dumps(args), [done[dep] for dep in deps])] = name
+            if not running:
+                raise ValueError("task graph has a cycle through %s" % ", ".join(sorted(pending)))
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                done[running.pop(future)] = future.result()
+    return {name: loads(val) for name, val in done.items()}
@@ -0,0 +1,173 @@
+#Pure-Python derived dimensions and feasibility checks for Hinge and HingeBox options
+#Nothing here touches CadQuery, so a bad option set is caught in microseconds instead of failing deep inside OCC
+#Structural options that break the part are rejected; the cosmetic arm chamfer and corner fillet can instead be clamped below their limit
+
+#Clamped values land at this fraction of their limit, leaving OCC room to build the neighbouring faces
+clamp_ratio = 0.9
+
+latch_w = 8 #width of the HingeBox screw latch, see HingeBox.build_lid_panels
+
+#Options taken as given by every check; merge them with the module's default_opts first
+def merged(defaults, args):
+    opts = defaults.copy()
+    for key, val in args.items():
+        if key in opts:
+            opts[key] = val
+    return opts
+
+#Arm widths Hinge.fixed_width_hinge picks so that the arms and clearances add up to hinge_w
+def fixed_width_arms(hinge_w, n_socket_arms=3, arm_w_ratio=0.5, interarm_clearance=0.1):
+    n_ball_arms = n_socket_arms + 1
+    socket_arm_w = (hinge_w - interarm_clearance * (n_socket_arms + n_ball_arms - 1)) / (n_ball_arms * arm_w_ratio + n_socket_arms)
+    return socket_arm_w, socket_arm_w * arm_w_ratio
+
+def hinge_dimensions(opts):
+    o = opts
+    n_ball_arms = o["n_socket_arms"] + 1
+    ball_diam = o["post_l"] - 2
+    ball_hinge_total_w = (o["n_socket_arms"] * o["socket_arm_w"]) + (n_ball_arms * o["ball_arm_w"]) + ((n_ball_arms + o["n_socket_arms"] - 1) * o["interarm_clearance"])
+    #Each half reaches total_l - ball_socket_x (plus its base sliver) from the fold axis
+    reach = o["arm_l"] + o["post_l"] / 2 + o["hinge_base_l"]
+    #The balls can stand proud of the post's top or bottom when arm_h is large against post_h
+    ball_socket_z = o["arm_h"] + o["post_h"] / 2 - ball_diam / 2
+    return {
+        "n_ball_arms": n_ball_arms,
+        "ball_diam": ball_diam,
+        "ball_socket_x": o["post_l"] / 2,
+        "ball_socket_z": ball_socket_z,
+        "total_l": o["arm_l"] + o["post_l"],
+        "ball_hinge_total_w": ball_hinge_total_w,
+        "socket_hinge_total_w": ball_hinge_total_w - 2 * (o["interarm_clearance"] + o["ball_arm_w"]),
+        "socket_cavity_diam": ball_diam + 2 * o["socket_ball_clearance"],
+        #Material left between the two ball dimples of a socket arm; at or below zero they meet and the arm gets a through hole
+        "socket_web_w": o["socket_arm_w"] - 2 * (ball_diam / 2 + 2 * o["socket_ball_clearance"]),
+        #Exact (min, max) corners of the unfolded hinge as Hinge.hinge() places it
+        "envelope": ((-reach, -ball_hinge_total_w / 2, min(0, ball_socket_z - ball_diam / 2)), (reach, ball_hinge_total_w / 2, max(o["post_h"], ball_socket_z + ball_diam / 2))),
+    }
+
+def _is_number(val):
+    return isinstance(val, (int, float)) and not isinstance(val, bool)
+
+#Problems for options that are not numbers (e.g. a text cell from a CSV), reported before any arithmetic touches them
+def type_problems(opts, keys):
+    return ["%s must be a number, got %r" % (key, opts[key]) for key in keys if not _is_number(opts[key])]
+
+_hinge_numbers = ("socket_arm_w", "ball_arm_w", "arm_l", "arm_h", "hinge_base_l", "post_h", "post_l", "socket_ball_clearance", "interarm_clearance", "arm_base_chamfer", "arm_corner_fillet", "folded_angle")
+_box_numbers = ("box_iw", "box_il", "box_ih", "wall_thick", "standoff_h")
+
+#Upper limits of the cosmetic features, from the faces they are cut into
+def _chamfer_limit(o):
+    return min(o["arm_h"], o["socket_arm_w"] / 2, o["ball_arm_w"] / 2)
+
+def _fillet_limit(o):
+    return min(o["post_h"] / 2, o["post_l"])
+
+#Returns (opts, problems); with clamp the chamfer and fillet are pulled inside their limits instead of being reported
+def check_hinge(opts, clamp=False):
+    o = dict(opts)
+    problems = []
+    def need(ok, msg):
+        if not ok:
+            problems.append(msg)
+
+    need(o["fidelity"] in ("full", "preview"), "fidelity must be 'full' or 'preview', got %r" % (o["fidelity"],))
+    need(isinstance(o["n_socket_arms"], int) and not isinstance(o["n_socket_arms"], bool) and o["n_socket_arms"] >= 1, "n_socket_arms must be a positive integer, got %r" % (o["n_socket_arms"],))
+    problems += type_problems(o, _hinge_numbers)
+    if problems:
+        return o, problems
+    need(o["socket_arm_w"] > 0, "socket_arm_w must be > 0, got %g" % o["socket_arm_w"])
+    need(o["ball_arm_w"] > 0, "ball_arm_w must be > 0, got %g" % o["ball_arm_w"])
+    need(o["arm_l"] > 0, "arm_l must be > 0, got %g" % o["arm_l"])
+    need(o["arm_h"] > 0, "arm_h must be > 0, got %g" % o["arm_h"])
+    need(o["post_h"] > o["arm_h"], "post_h (%g) must be > arm_h (%g)" % (o["post_h"], o["arm_h"]))
+    need(o["post_l"] > 2, "post_l must be > 2 so the ball diameter (post_l - 2) is positive, got %g" % o["post_l"])
+    need(o["hinge_base_l"] > 0, "hinge_base_l must be > 0, got %g" % o["hinge_base_l"])
+    need(o["socket_ball_clearance"] >= 0, "socket_ball_clearance must be >= 0, got %g" % o["socket_ball_clearance"])
+    need(o["interarm_clearance"] >= 0, "interarm_clearance must be >= 0, got %g" % o["interarm_clearance"])
+    if problems:
+        return o, problems
+
+    if not o["fidelity"] == "preview":
+        chamfer_limit = _chamfer_limit(o)
+        if not 0 <= o["arm_base_chamfer"] < chamfer_limit:
+            if clamp:
+                o["arm_base_chamfer"] = min(max(o["arm_base_chamfer"], 0), chamfer_limit * clamp_ratio)
+            else:
+                problems.append("arm_base_chamfer must be in [0, %g) (arm_h and half of each arm width), got %g" % (chamfer_limit, o["arm_base_chamfer"]))
+        fillet_limit = _fillet_limit(o)
+        if not 0 <= o["arm_corner_fillet"] < fillet_limit:
+            if clamp:
+                o["arm_corner_fillet"] = min(max(o["arm_corner_fillet"], 0), fillet_limit * clamp_ratio)
+            else:
+                problems.append("arm_corner_fillet must be in [0, %g) (the smaller of post_h/2 and post_l), got %g" % (fillet_limit, o["arm_corner_fillet"]))
+    return o, problems
+
+#Returns (opts, dimensions) for a feasible hinge, otherwise raises ValueError listing every problem
+def validate_hinge(opts, clamp=False):
+    o, problems = check_hinge(opts, clamp)
+    if problems:
+        raise ValueError("infeasible hinge options: " + "; ".join(problems))
+    return o, hinge_dimensions(o)
+
+#Options of the hinges HingeBox builds: hinge defaults plus the box's arm count and fixed width, as in HingeBox.box_hinge
+def box_hinge_opts(box_opts, hinge_defaults):
+    socket_arm_w, ball_arm_w = fixed_width_arms(box_opts["box_il"] - 1, box_opts["n_socket_arms"])
+    return merged(hinge_defaults, {
+        "n_socket_arms": box_opts["n_socket_arms"],
+        "socket_arm_w": socket_arm_w,
+        "ball_arm_w": ball_arm_w,
+        "fidelity": box_opts["fidelity"],
+    })
+
+def box_dimensions(opts, hinge_dims=None):
+    o = opts
+    d = {
+        "box_ow": o["box_iw"] + o["wall_thick"] * 2,
+        "box_ol": o["box_il"] + o["wall_thick"] * 2,
+        "box_oh": o["box_ih"] + o["wall_thick"],
+        "hinge_w": o["box_il"] - 1,
+    }
+    if hinge_dims:
+        bsx = hinge_dims["ball_socket_x"]
+        d.update({
+            "wall_x": d["box_ow"] / 2 - bsx,
+            "ceil_x": d["box_ow"] / 2 + d["box_oh"] - 3 * bsx,
+            "wall_h": d["box_oh"] - hinge_dims["total_l"],
+            "ceil_l": d["box_ow"] - hinge_dims["total_l"] + bsx,
+        })
+    return d
+
+#Returns (opts, hinge_opts, problems) for a HingeBox; clamp applies to the box's hinges
+def check_hinge_box(opts, hinge_defaults, screw_closure=1, clamp=False):
+    o = opts
+    problems = type_problems(o, _box_numbers)
+    if not (isinstance(o["n_socket_arms"], int) and not isinstance(o["n_socket_arms"], bool) and o["n_socket_arms"] >= 1):
+        problems.append("n_socket_arms must be a positive integer, got %r" % (o["n_socket_arms"],))
+    if problems:
+        return o, None, problems
+    for key in _box_numbers:
+        if not o[key] > 0:
+            problems.append("%s must be > 0, got %g" % (key, o[key]))
+    if problems:
+        return o, None, problems
+    hinge_opts, hinge_problems = check_hinge(box_hinge_opts(o, hinge_defaults), clamp)
+    problems += ["hinge (%g wide): %s" % (o["box_il"] - 1, p) for p in hinge_problems]
+    if hinge_problems:
+        return o, hinge_opts, problems
+    d = box_dimensions(o, hinge_dimensions(hinge_opts))
+    if not d["wall_h"] > 0:
+        problems.append("box_ih + wall_thick (%g) must exceed the hinge length (%g) to leave a wall" % (d["box_oh"], d["box_oh"] - d["wall_h"]))
+    if screw_closure and not d["ceil_l"] > o["wall_thick"] + latch_w + 1:
+        problems.append("the ceiling (%g long) is too short for the screw latch (needs > %g); widen box_iw or pass screw_closure=0" % (d["ceil_l"], o["wall_thick"] + latch_w + 1))
+    elif not d["ceil_l"] > 0:
+        problems.append("box_iw is too small to leave a ceiling next to the hinge")
+    return o, hinge_opts, problems
+
+#Returns (opts, dimensions) for a feasible HingeBox, otherwise raises ValueError listing every problem
+#The dimensions include the box's hinge dimensions under "hinge"
+def validate_hinge_box(opts, hinge_defaults, screw_closure=1, clamp=False):
+    o, hinge_opts, problems = check_hinge_box(opts, hinge_defaults, screw_closure, clamp)
+    if problems:
+        raise ValueError("infeasible hinge box options: " + "; ".join(problems))
+    hinge_dims = hinge_dimensions(hinge_opts)
+    return o, dict(box_dimensions(o, hinge_dims), hinge=hinge_dims, hinge_opts=hinge_opts)
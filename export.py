@@ -0,0 +1,242 @@
+import hashlib
+import io
+import json
+import os
+import struct
+import uuid
+import xml.etree.ElementTree as ET
+import zipfile
+
+import lazy
+
+cq = lazy.module("cadquery")
+np = lazy.module("numpy")
+
+#Linear deflection in mm and angular deflection in radians, both absolute
+presets = {
+    "coarse": {"tolerance": 0.05, "angular_tolerance": 0.5},
+    "fine": {"tolerance": 0.01, "angular_tolerance": 0.1},
+}
+
+default_opts = {
+    "out_dir": os.environ.get("CQ_HINGE_EXPORT_DIR", "stl"),
+    "format": "stl", #"stl" (binary) or "3mf"
+    "preset": "coarse",
+    "tolerance": None, #overrides the preset's linear deflection
+    "angular_tolerance": None, #overrides the preset's angular deflection
+    "workers": None, #processes used to tessellate; None uses one per core, capped at the number of shapes
+}
+
+def _to_shape(obj):
+    if isinstance(obj, cq.Workplane):
+        vals = [v for v in obj.vals() if isinstance(v, cq.Shape)]
+        return vals[0] if len(vals) == 1 else cq.Compound.makeCompound(vals)
+    return obj
+
+#Tessellates and writes one shape to a temporary file next to path, then renames it into place
+def write_mesh(shape, path, fmt, tolerance, angular_tolerance):
+    tmp = os.path.join(os.path.dirname(path), ".%s.tmp-%s" % (os.path.basename(path), uuid.uuid4().hex))
+    try:
+        if fmt == "stl":
+            shape.exportStl(tmp, tolerance, angular_tolerance, ascii=False, relative=False)
+        elif fmt == "3mf":
+            cq.exporters.export(shape, tmp, cq.exporters.ExportTypes.THREEMF, tolerance, angular_tolerance)
+        else:
+            raise ValueError("unknown export format %r" % (fmt,))
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+def _tolerances(opts):
+    preset = presets[opts["preset"]]
+    tolerance = opts["tolerance"] if opts["tolerance"] is not None else preset["tolerance"]
+    angular_tolerance = opts["angular_tolerance"] if opts["angular_tolerance"] is not None else preset["angular_tolerance"]
+    return tolerance, angular_tolerance
+
+#Exports {name: shape} to <out_dir>/<name>.<format>, tessellating shapes concurrently in worker processes
+#Returns {name: path}
+def export_shapes(shapes, **args):
+    opts = default_opts.copy()
+    for key, val in args.items():
+        if key in opts:
+            opts[key] = val
+    tolerance, angular_tolerance = _tolerances(opts)
+
+    os.makedirs(opts["out_dir"], exist_ok=True)
+    jobs = {name: (_to_shape(shape), os.path.join(opts["out_dir"], "%s.%s" % (name, opts["format"]))) for name, shape in shapes.items()}
+
+    workers = min(opts["workers"] or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        return {name: write_mesh(shape, path, opts["format"], tolerance, angular_tolerance) for name, (shape, path) in jobs.items()}
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    #spawn, not fork: forking after OCC's thread pool has started can deadlock the workers
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {name: pool.submit(write_mesh, shape, path, opts["format"], tolerance, angular_tolerance) for name, (shape, path) in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+#Meshes a shape and returns (float32 Nx3 vertices, uint32 Mx3 triangles) in the shape's own coordinates
+def triangulate(shape, tolerance, angular_tolerance):
+    from OCP.BRep import BRep_Tool
+    from OCP.BRepMesh import BRepMesh_IncrementalMesh
+    from OCP.TopAbs import TopAbs_REVERSED
+    from OCP.TopLoc import TopLoc_Location
+    BRepMesh_IncrementalMesh(shape.wrapped, tolerance, False, angular_tolerance, True)
+    vertices = []
+    triangles = []
+    offset = 0
+    for face in shape.Faces():
+        loc = TopLoc_Location()
+        poly = BRep_Tool.Triangulation_s(face.wrapped, loc)
+        if poly is None:
+            continue
+        trsf = loc.Transformation()
+        for i in range(1, poly.NbNodes() + 1):
+            p = poly.Node(i).Transformed(trsf)
+            vertices.append((p.X(), p.Y(), p.Z()))
+        reverse = face.wrapped.Orientation() == TopAbs_REVERSED
+        for i in range(1, poly.NbTriangles() + 1):
+            a, b, c = poly.Triangle(i).Get()
+            triangles.append((offset + a - 1, offset + c - 1, offset + b - 1) if reverse else (offset + a - 1, offset + b - 1, offset + c - 1))
+        offset += poly.NbNodes()
+    return np.array(vertices, dtype=np.float32).reshape(-1, 3), np.array(triangles, dtype=np.uint32).reshape(-1, 3)
+
+def _matrix(loc):
+    trsf = loc.wrapped.Transformation()
+    return np.array([[trsf.Value(r, c) for c in range(1, 5)] for r in range(1, 4)] + [[0, 0, 0, 1]])
+
+#Hash of the exact B-rep without triangulation, so geometry that was rebuilt (or reloaded from the cache) still shares one mesh
+def _geometry_key(shape):
+    from OCP.BRepTools import BRepTools
+    from OCP.TopTools import TopTools_FormatVersion
+    stream = io.BytesIO()
+    BRepTools.Write_s(shape.wrapped, stream, False, False, TopTools_FormatVersion.TopTools_FormatVersion_CURRENT)
+    return hashlib.sha256(stream.getvalue()).hexdigest()
+
+#Yields (name, base, matrix) for every solid in an assembly: its path name, the solid at the identity location and its 4x4 world matrix
+def iter_solids(assy):
+    def walk(node, parent_loc, path):
+        loc = parent_loc * node.loc
+        name = path + "/" + node.name if path else node.name
+        if node.obj is not None:
+            shapes = node.obj.vals() if isinstance(node.obj, cq.Workplane) else [node.obj]
+            for i, shape in enumerate(s for s in shapes if isinstance(s, cq.Shape)):
+                for j, solid in enumerate(shape.Solids() or [shape]):
+                    yield "%s/%d.%d" % (name, i, j), solid.located(cq.Location()), _matrix(loc * solid.location())
+        for child in node.children:
+            yield from walk(child, loc, name)
+    return walk(assy, cq.Location(), "")
+
+#Flattens an assembly into unique meshes plus (name, mesh index, 4x4 world matrix) instances
+#Shapes that share a TShape (located copies) or have identical B-reps are tessellated once
+def collect_instances(assy, tolerance, angular_tolerance):
+    meshes = []
+    by_tshape = {}
+    by_geometry = {}
+    instances = []
+
+    def mesh_index(base):
+        tshape = base.wrapped.TShape()
+        if tshape not in by_tshape:
+            key = _geometry_key(base)
+            if key not in by_geometry:
+                by_geometry[key] = len(meshes)
+                meshes.append(triangulate(base, tolerance, angular_tolerance))
+            by_tshape[tshape] = by_geometry[key]
+        return by_tshape[tshape]
+
+    for name, base, m in iter_solids(assy):
+        instances.append((name, mesh_index(base), m))
+    return meshes, instances
+
+def _write_3mf(path, meshes, instances):
+    ns = "http://schemas.microsoft.com/3dmanufacturing/core/2015/02"
+    model = ET.Element("model", {"xmlns": ns, "unit": "millimeter", "xml:lang": "en-US"})
+    resources = ET.SubElement(model, "resources")
+    for i, (vertices, triangles) in enumerate(meshes):
+        mesh = ET.SubElement(ET.SubElement(resources, "object", id=str(i + 1), type="model"), "mesh")
+        verts = ET.SubElement(mesh, "vertices")
+        for x, y, z in vertices.tolist():
+            ET.SubElement(verts, "vertex", x="%.6g" % x, y="%.6g" % y, z="%.6g" % z)
+        tris = ET.SubElement(mesh, "triangles")
+        for a, b, c in triangles.tolist():
+            ET.SubElement(tris, "triangle", v1=str(a), v2=str(b), v3=str(c))
+    #One component per instance, all pointing at the shared mesh objects; 3MF transforms are row-vector 3x4 matrices
+    assembly_id = str(len(meshes) + 1)
+    components = ET.SubElement(ET.SubElement(resources, "object", id=assembly_id, type="model"), "components")
+    for _, index, m in instances:
+        transform = " ".join("%.9g" % v for v in list(m[:3, :3].T.flatten()) + list(m[:3, 3]))
+        ET.SubElement(components, "component", objectid=str(index + 1), transform=transform)
+    ET.SubElement(ET.SubElement(model, "build"), "item", objectid=assembly_id)
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/></Types>')
+        zf.writestr("_rels/.rels", '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Target="/3D/3dmodel.model" Id="rel0" Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/></Relationships>')
+        zf.writestr("3D/3dmodel.model", ET.tostring(model, xml_declaration=True, encoding="UTF-8"))
+
+def _write_glb(path, meshes, instances):
+    gltf = {"asset": {"version": "2.0", "generator": "cq_hinge"}, "buffers": [], "bufferViews": [], "accessors": [], "meshes": [], "nodes": [], "scenes": [{"nodes": [0]}], "scene": 0}
+    blob = bytearray()
+
+    def add_view(data, target):
+        while len(blob) % 4:
+            blob.append(0)
+        gltf["bufferViews"].append({"buffer": 0, "byteOffset": len(blob), "byteLength": len(data), "target": target})
+        blob.extend(data)
+        return len(gltf["bufferViews"]) - 1
+
+    for vertices, triangles in meshes:
+        position = len(gltf["accessors"])
+        gltf["accessors"].append({"bufferView": add_view(vertices.tobytes(), 34962), "componentType": 5126, "count": len(vertices), "type": "VEC3",
+                                  "min": vertices.min(axis=0).tolist() if len(vertices) else [0, 0, 0], "max": vertices.max(axis=0).tolist() if len(vertices) else [0, 0, 0]})
+        gltf["accessors"].append({"bufferView": add_view(triangles.tobytes(), 34963), "componentType": 5125, "count": triangles.size, "type": "SCALAR"})
+        gltf["meshes"].append({"primitives": [{"attributes": {"POSITION": position}, "indices": position + 1}]})
+
+    #glTF is in metres with Y up, so the root node scales from millimetres and turns CadQuery's Z up into Y up
+    gltf["nodes"].append({"name": "root", "matrix": [0.001, 0, 0, 0, 0, 0, -0.001, 0, 0, 0.001, 0, 0, 0, 0, 0, 1], "children": list(range(1, len(instances) + 1))})
+    for name, index, m in instances:
+        gltf["nodes"].append({"name": name, "mesh": index, "matrix": m.T.flatten().tolist()})
+    gltf["buffers"].append({"byteLength": len(blob)})
+
+    header = json.dumps(gltf, separators=(",", ":")).encode()
+    header += b" " * (-len(header) % 4)
+    blob.extend(b"\0" * (-len(blob) % 4))
+    with open(path, "wb") as f:
+        f.write(struct.pack("<III", 0x46546C67, 2, 12 + 8 + len(header) + 8 + len(blob)))
+        f.write(struct.pack("<II", len(header), 0x4E4F534A) + header)
+        f.write(struct.pack("<II", len(blob), 0x004E4942) + bytes(blob))
+
+#Writes meshes and instances to a .3mf (components) or .glb (nodes) scene
+def write_scene(path, meshes, instances):
+    writers = {".3mf": _write_3mf, ".glb": _write_glb}
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in writers:
+        raise ValueError("instanced export supports .3mf and .glb, got %r" % (path,))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = os.path.join(os.path.dirname(path), ".%s.tmp-%s" % (os.path.basename(path), uuid.uuid4().hex))
+    try:
+        writers[ext](tmp, meshes, instances)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+#Exports a cq.Assembly (e.g. Hinge.hinge_parts()["assembly"]) to .3mf or .glb keeping repeated geometry as one mesh
+#with per-instance transforms (3MF components / glTF nodes). Returns {"path", "meshes", "instances"}
+def export_instanced(assy, path, **args):
+    opts = default_opts.copy()
+    for key, val in args.items():
+        if key in opts:
+            opts[key] = val
+    tolerance, angular_tolerance = _tolerances(opts)
+    meshes, instances = collect_instances(assy, tolerance, angular_tolerance)
+    write_scene(path, meshes, instances)
+    return {"path": path, "meshes": len(meshes), "instances": len(instances)}
@@ -1,4 +1,14 @@
-import cadquery as cq
+import collections
+import json
+
+from booleans import fuse_all
+import brep_cache
+import dimensions
+import export
+import lazy
+import profiling
+
+cq = lazy.module("cadquery")
 
 default_opts = {
     "n_socket_arms": 3,
@@ -14,9 +24,39 @@ default_opts = {
     "arm_base_chamfer": 0.5,
     "arm_corner_fillet": 1,
     "folded_angle": 0,
-    "export_stl": 0
+    "export_stl": 0,
+    "fidelity": "full", #"preview" drops chamfers/fillets and swaps the spherical balls and sockets for boxes
+    "batch_booleans": 1, #fuse all arms in one boolean instead of one union per arm
+    "parallel_booleans": 1
 }
 
+#Options that only place the halves or pick a boolean strategy and so never change the cached half geometry
+_placement_opts = ("folded_angle", "export_stl", "batch_booleans", "parallel_booleans")
+
+#Arm solids keyed by the options that shape them, reused across hinges and placed as located instances
+#Every distinct hinge width gives new arm widths, so long-lived processes keep only the arm_cache_size most recently used arms
+arm_cache_size = 256
+_arm_cache = collections.OrderedDict()
+
+#In-process LRU of hinge halves and placed hinges keyed by their resolved options and fold angle
+#A HingeBox asks for the same hinge up to three times per build; every request after the first is a lookup
+memo_size = 32
+memo_stats = {"hits": 0, "misses": 0}
+_memo = collections.OrderedDict()
+
+def memoized(kind, key, build):
+    key = json.dumps([kind, brep_cache.normalize(key)], sort_keys=True)
+    if key in _memo:
+        memo_stats["hits"] += 1
+        _memo.move_to_end(key)
+        return _memo[key]
+    memo_stats["misses"] += 1
+    val = build()
+    _memo[key] = val
+    while len(_memo) > memo_size:
+        _memo.popitem(last=False)
+    return val
+
 class Hinge:
     def __init__(self, **args):
         self.opts = default_opts
@@ -29,14 +69,65 @@ class Hinge:
                 full_opts[key] = val
         self.opts = full_opts
         #Recompute values for publically avail properties
-        self.ball_diam = self.opts["post_l"] - 2
-        self.ball_socket_x = self.opts["post_l"] / 2
-        self.ball_socket_z = self.opts["arm_h"] + self.opts["post_h"] / 2 - self.ball_diam / 2
-        self.total_l = self.opts["arm_l"] + self.opts["post_l"]
+        d = dimensions.hinge_dimensions(self.opts)
+        self.ball_diam = d["ball_diam"]
+        self.ball_socket_x = d["ball_socket_x"]
+        self.ball_socket_z = d["ball_socket_z"]
+        self.total_l = d["total_l"]
         self.arm_l = self.opts["arm_l"]
+        self.envelope = d["envelope"]
 
 
-    def hinge(self):
+    #Builds each hinge half exactly once (or loads it from the BREP cache) and returns them alongside the assembly that places them
+    #Raises ValueError for infeasible options before any geometry is built
+    def hinge_parts(self):
+        o = self.opts
+        dimensions.validate_hinge(o)
+        folded_angle = o["folded_angle"]
+        export_stl = o["export_stl"]
+        ball_socket_x = self.ball_socket_x
+        ball_socket_z = self.ball_socket_z
+
+        geometry_opts = {key: val for key, val in o.items() if key not in _placement_opts}
+        with profiling.step("hinge.halves"):
+            halves = memoized("halves", geometry_opts, lambda: brep_cache.cache.cached("hinge", geometry_opts, {}, self.build_halves, modules=("hinge", "dimensions", "booleans")))
+        bh = cq.Workplane("XY").newObject([halves["ball_hinge"]])
+        sh = cq.Workplane("XY").newObject([halves["socket_hinge"]])
+
+        alpha = 0.5
+        a = cq.Assembly()
+        if (folded_angle > 0 and not export_stl):
+            a = a.add(
+                    bh.translate((-ball_socket_x,0,-ball_socket_z)),
+                    name="ball_hinge",
+                    loc=cq.Location(cq.Vector(0, 0, 0), cq.Vector(0, 1, 0), -folded_angle),
+                    color=cq.Color(0,0.2,0,alpha)
+                ).add(
+                    sh, 
+                    name="socket_hinge",
+                    loc=cq.Location(cq.Vector(ball_socket_x, 0, -ball_socket_z), cq.Vector(0, 0, 1), 180),
+                    color=cq.Color(0,0,0.2,alpha)
+                )
+        else:
+            a = a.add(
+                    bh, 
+                    loc=cq.Location(cq.Vector(-ball_socket_x, 0, 0)),
+                    color=cq.Color(0,0.2,0,alpha)
+                ).add(
+                    sh, 
+                    loc=cq.Location(cq.Vector(ball_socket_x, 0, 0), cq.Vector(0, 0, 1), 180),
+                    color=cq.Color(0,0,0.2,alpha)
+                )
+
+        return {"ball_hinge": bh, "socket_hinge": sh, "assembly": a}
+
+    #Uses halves built elsewhere (e.g. in another process) for these options instead of building them again
+    def seed_halves(self, halves):
+        geometry_opts = {key: val for key, val in self.opts.items() if key not in _placement_opts}
+        memoized("halves", geometry_opts, lambda: halves)
+
+    #Builds the unplaced ball and socket halves from scratch
+    def build_halves(self):
         o = self.opts
         
         n_socket_arms = o["n_socket_arms"]
@@ -51,8 +142,9 @@ class Hinge:
         interarm_clearance = o["interarm_clearance"]
         arm_base_chamfer = o["arm_base_chamfer"]
         arm_corner_fillet = o["arm_corner_fillet"]
-        folded_angle = o["folded_angle"]
-        export_stl = o["export_stl"]
+        batch_booleans = o["batch_booleans"]
+        parallel_booleans = o["parallel_booleans"]
+        preview = o["fidelity"] == "preview"
 
         ###
         #COMPUTED VALUES
@@ -63,67 +155,99 @@ class Hinge:
         ball_socket_x = self.ball_socket_x
         ball_socket_z = self.ball_socket_z
 
-        ball_hinge_total_w = (n_socket_arms * socket_arm_w) + (n_ball_arms * ball_arm_w) + ((n_ball_arms + n_socket_arms - 1) * interarm_clearance)
-        socket_hinge_total_w = ball_hinge_total_w - 2*(interarm_clearance+ball_arm_w)
+        d = dimensions.hinge_dimensions(o)
+        ball_hinge_total_w = d["ball_hinge_total_w"]
+        socket_hinge_total_w = d["socket_hinge_total_w"]
 
         def socket_arm():
-            s = cq.Workplane("XZ").sketch().polygon([
-                [0, 0],
-                [arm_l+post_l, 0],
-                [arm_l+post_l, arm_h],
-                [post_l, arm_h],
-                [post_l, post_h],
-                [0, post_h],
-                [0, 0]
-            ]).finalize().extrude(socket_arm_w/2, both=1)
-            s = s.faces("<Z").edges("not |Y").chamfer(arm_base_chamfer)
-            s = s.faces("<Z or >Z").edges("<X").fillet(arm_corner_fillet)
+            with profiling.step("hinge.arm_profile"):
+                s = profiling.result(cq.Workplane("XZ").sketch().polygon([
+                    [0, 0],
+                    [arm_l+post_l, 0],
+                    [arm_l+post_l, arm_h],
+                    [post_l, arm_h],
+                    [post_l, post_h],
+                    [0, post_h],
+                    [0, 0]
+                ]).finalize().extrude(socket_arm_w/2, both=1))
+            if not preview:
+                with profiling.step("hinge.arm_chamfer"):
+                    s = profiling.result(s.faces("<Z").edges("not |Y").chamfer(arm_base_chamfer))
+                with profiling.step("hinge.arm_fillet"):
+                    s = profiling.result(s.faces("<Z or >Z").edges("<X").fillet(arm_corner_fillet))
             def ball_cutout(face_sel_str):
                 nonlocal s
-                sphere_cutout = s.faces(face_sel_str)\
+                cutout_plane = s.faces(face_sel_str)\
                     .workplane(
                         offset=-socket_ball_clearance, 
                         origin=(ball_socket_x, 0, ball_socket_z)
-                    )\
-                    .sphere(socket_ball_clearance + (ball_diam)/2, combine=False)
+                    )
+                if preview:
+                    cutout_w = 2*socket_ball_clearance + ball_diam
+                    sphere_cutout = cutout_plane.box(cutout_w, cutout_w, cutout_w, combine=False)
+                else:
+                    sphere_cutout = cutout_plane.sphere(socket_ball_clearance + (ball_diam)/2, combine=False)
                 s = s.cut(sphere_cutout)
-            ball_cutout("<Y")
-            ball_cutout(">Y")
+            with profiling.step("hinge.socket_cutouts"):
+                ball_cutout("<Y")
+                ball_cutout(">Y")
+                profiling.result(s)
             return s
         
         #drop_ball allows you to skip drawing a ball on the positive (1) or negative (-1) side of the post
         def ball_arm(drop_ball=0):
-            b = cq.Workplane("XZ").sketch().polygon([
-                [0, 0],
-                [arm_l+post_l, 0],
-                [arm_l+post_l, arm_h],
-                [post_l, arm_h],
-                [post_l, post_h],
-                [0, post_h],
-                [0, 0]
-            ]).finalize().extrude(ball_arm_w/2, both=1)
-            b = b.faces("<Z").edges("not |Y").chamfer(arm_base_chamfer)
-            b = b.faces("<Z or >Z").edges("<X").fillet(arm_corner_fillet)
+            with profiling.step("hinge.arm_profile"):
+                b = profiling.result(cq.Workplane("XZ").sketch().polygon([
+                    [0, 0],
+                    [arm_l+post_l, 0],
+                    [arm_l+post_l, arm_h],
+                    [post_l, arm_h],
+                    [post_l, post_h],
+                    [0, post_h],
+                    [0, 0]
+                ]).finalize().extrude(ball_arm_w/2, both=1))
+            if not preview:
+                with profiling.step("hinge.arm_chamfer"):
+                    b = profiling.result(b.faces("<Z").edges("not |Y").chamfer(arm_base_chamfer))
+                with profiling.step("hinge.arm_fillet"):
+                    b = profiling.result(b.faces("<Z or >Z").edges("<X").fillet(arm_corner_fillet))
 
             def ball(face_sel_str):
                 nonlocal b
-                b = b.faces(face_sel_str)\
+                ball_plane = b.faces(face_sel_str)\
                     .workplane(
                         origin=(ball_socket_x,0, ball_socket_z)
-                    )\
-                    .sphere(ball_diam/2)
-            if drop_ball!=1:
-                ball(">Y")
-            if drop_ball!=-1:
-                ball("<Y")
+                    )
+                b = ball_plane.box(ball_diam, ball_diam, ball_diam) if preview else ball_plane.sphere(ball_diam/2)
+            with profiling.step("hinge.balls"):
+                if drop_ball!=1:
+                    ball(">Y")
+                if drop_ball!=-1:
+                    ball("<Y")
+                profiling.result(b)
 
             return b
 
+        #Build each distinct arm once and hand out located copies of the cached solid
+        def arm_instance(kind, y, drop_ball=0):
+            arm_w = socket_arm_w if kind == "socket" else ball_arm_w
+            key = (kind, drop_ball, preview, arm_w, arm_l, arm_h, post_l, post_h, arm_base_chamfer, arm_corner_fillet, socket_ball_clearance)
+            if key in _arm_cache:
+                _arm_cache.move_to_end(key)
+            else:
+                with profiling.step("hinge.%s_arm" % kind):
+                    arm = socket_arm() if kind == "socket" else ball_arm(drop_ball)
+                    _arm_cache[key] = profiling.result(arm.findSolid())
+                while len(_arm_cache) > arm_cache_size:
+                    _arm_cache.popitem(last=False)
+            return _arm_cache[key].moved(cq.Location(cq.Vector(0, y, 0)))
+
         def ball_hinge():    
             bh = cq.Workplane("XY").rect(hinge_base_l,ball_hinge_total_w,centered=[0,1,0]).extrude(2).translate((arm_l+post_l,0))
             start_y = -ball_hinge_total_w/2 + ball_arm_w/2
             spacing = ball_arm_w + socket_arm_w + 2*interarm_clearance
 
+            arms = []
             for i in range(n_ball_arms):
                 drop_ball = 0
                 if i == 0:
@@ -131,67 +255,68 @@ class Hinge:
                 if i == n_ball_arms-1:
                     drop_ball = 1
                 
-                bh = bh.workplane().union(ball_arm(drop_ball).translate([0,start_y+spacing*i]))
+                arms.append(arm_instance("ball", start_y+spacing*i, drop_ball))
 
-            return bh
+            with profiling.step("hinge.fuse_ball_arms"):
+                return profiling.result(fuse_all(bh, arms, batch_booleans, parallel_booleans, preview))
 
         def socket_hinge():
             sh = cq.Workplane("XY").rect(hinge_base_l,ball_hinge_total_w,centered=[0,1,0]).extrude(2).translate((arm_l+post_l,0))
             start_y = -socket_hinge_total_w/2 + socket_arm_w/2
             spacing = ball_arm_w + socket_arm_w + 2*interarm_clearance
 
-            for i in range(n_socket_arms):
-                sh = sh.workplane().union(socket_arm().translate([0,start_y+spacing*i]))
+            arms = [arm_instance("socket", start_y+spacing*i) for i in range(n_socket_arms)]
 
-            return sh
+            with profiling.step("hinge.fuse_socket_arms"):
+                return profiling.result(fuse_all(sh, arms, batch_booleans, parallel_booleans, preview))
 
-        bh = ball_hinge()
-        sh = socket_hinge()
+        return {"ball_hinge": ball_hinge().findSolid(), "socket_hinge": socket_hinge().findSolid()}
 
-        alpha = 0.5
-        a = cq.Assembly()
-        if (folded_angle > 0 and not export_stl):
-            a = a.add(
-                    ball_hinge().translate((-ball_socket_x,0,-ball_socket_z)),
-                    name="ball_hinge",
-                    loc=cq.Location(cq.Vector(0, 0, 0), cq.Vector(0, 1, 0), -folded_angle),
-                    color=cq.Color(0,0.2,0,alpha)
-                ).add(
-                    socket_hinge(), 
-                    name="socket_hinge",
-                    loc=cq.Location(cq.Vector(ball_socket_x, 0, -ball_socket_z), cq.Vector(0, 0, 1), 180),
-                    color=cq.Color(0,0,0.2,alpha)
-                )
-        else:
-            a = a.add(
-                    ball_hinge(), 
-                    loc=cq.Location(cq.Vector(-ball_socket_x, 0, 0)),
-                    color=cq.Color(0,0.2,0,alpha)
-                ).add(
-                    socket_hinge(), 
-                    loc=cq.Location(cq.Vector(ball_socket_x, 0, 0), cq.Vector(0, 0, 1), 180),
-                    color=cq.Color(0,0,0.2,alpha)
-                )
+    #Returns the placed hinge as a compound; the halves stay available on self.parts for reuse
+    def hinge(self):
+        with profiling.step("hinge"):
+            return profiling.result(self.place_hinge())
+
+    #Placed hinges are memoized unless they are exported; every angle <= 0 places the halves unfolded
+    def place_hinge(self):
+        folded_angle = self.opts["folded_angle"]
+        export_stl = self.opts["export_stl"]
+        if not export_stl:
+            geometry_opts = {key: val for key, val in self.opts.items() if key not in _placement_opts}
+            self.parts, a = memoized("placed", [geometry_opts, max(folded_angle, 0)], self.build_placed)
+            return a
+        self.parts, a = self.build_placed()
+        return a
+
+    def build_placed(self):
+        folded_angle = self.opts["folded_angle"]
+        export_stl = self.opts["export_stl"]
+
+        self.parts = self.hinge_parts()
+        bh = self.parts["ball_hinge"]
+        sh = self.parts["socket_hinge"]
+        with profiling.step("hinge.assembly"):
+            a = self.parts["assembly"].toCompound()
         
         if(export_stl):
-            cq.exporters.export(bh, "stl/ball_hinge.stl")
-            cq.exporters.export(sh, "stl/socket_hinge.stl")
-            cq.exporters.export(a.toCompound(), "stl/hinge.stl")
+            with profiling.step("hinge.export"):
+                export.export_shapes({"ball_hinge": bh, "socket_hinge": sh, "hinge": a})
             #a.save("stl/hinge.step")
-        a = a.toCompound()
         if (folded_angle > 0 and not export_stl): 
             #a = a.translate((ball_socket_x + arm_l, 0, ball_socket_z))
-            a = a.translate((0, 0, ball_socket_z))
+            a = a.translate((0, 0, self.ball_socket_z))
         else:
             #a = a.translate((ball_socket_x + arm_l, 0, 0))
             a = a.translate((0, 0, 0))
-        return a 
+        return self.parts, a
 
-    def fixed_width_hinge(self, hinge_w, n_socket_arms=3, arm_w_ratio=0.5, interarm_clearance=0.1, **args):
-        n_ball_arms = n_socket_arms + 1
-        socket_arm_w = (hinge_w - interarm_clearance * (n_socket_arms + n_ball_arms - 1)) / (n_ball_arms * arm_w_ratio + n_socket_arms)
-        ball_arm_w = socket_arm_w * arm_w_ratio
+    #Sets the arm widths so the hinge spans hinge_w, without building anything
+    def fixed_width(self, hinge_w, n_socket_arms=3, arm_w_ratio=0.5, interarm_clearance=0.1, **args):
+        socket_arm_w, ball_arm_w = dimensions.fixed_width_arms(hinge_w, n_socket_arms, arm_w_ratio, interarm_clearance)
         self.reload_default_opts(n_socket_arms=n_socket_arms, socket_arm_w=socket_arm_w, ball_arm_w=ball_arm_w, **args)
+
+    def fixed_width_hinge(self, hinge_w, n_socket_arms=3, arm_w_ratio=0.5, interarm_clearance=0.1, **args):
+        self.fixed_width(hinge_w, n_socket_arms, arm_w_ratio, interarm_clearance, **args)
         return self.hinge()
 
 #show_object(Hinge(export_stl=0, folded_angle=30).hinge())
@@ -1,5 +1,18 @@
-import cadquery as cq
-from hinge import Hinge
+import numbers
+import pickle
+
+from hinge import Hinge, default_opts as hinge_default_opts, memoized
+from booleans import fuse_all, cut_all
+from cutouts import cutout_tools
+import brep_cache
+import dag
+import dimensions
+import export
+import lazy
+import preview
+import profiling
+
+cq = lazy.module("cadquery")
 
 default_opts = {
     "box_iw": 25,
@@ -7,17 +20,57 @@ default_opts = {
     "box_ih": 25,
     "wall_thick": 2,
     "standoff_h": 6,
+    "n_socket_arms": 3, #socket arms per hinge; the hinges always span box_il-1
+    "fidelity": "full", #"preview" builds low-fidelity hinges; cutout callbacks can check it to skip cosmetic fillets
+    "batch_booleans": 1, #collect tool solids and apply them in one fuse/cut per part
+    "parallel_booleans": 1,
+    "feature_workers": 0, #processes for the independent feature branches of a single box; 0 builds them one after another
 }
 
-def bbox_solid(shape, min_offset=(0,0,0), max_offset=(0,0,0)):
-        bbox = shape.BoundingBox()
+#Box solid over the (min, max) corners lo and hi, grown by min_offset and max_offset
+def box_solid(lo, hi, min_offset=(0,0,0), max_offset=(0,0,0)):
         return cq.Solid.makeBox(
-            bbox.xlen+min_offset[0]+max_offset[0],
-            bbox.ylen+min_offset[1]+max_offset[1],
-            bbox.zlen+min_offset[2]+max_offset[2],
-            pnt=cq.Vector(bbox.xmin-min_offset[0], bbox.ymin-min_offset[1], bbox.zmin-min_offset[2]),
+            hi[0]-lo[0]+min_offset[0]+max_offset[0],
+            hi[1]-lo[1]+min_offset[1]+max_offset[1],
+            hi[2]-lo[2]+min_offset[2]+max_offset[2],
+            pnt=cq.Vector(lo[0]-min_offset[0], lo[1]-min_offset[1], lo[2]-min_offset[2]),
         )
 
+def bbox_solid(shape, min_offset=(0,0,0), max_offset=(0,0,0)):
+        bbox = shape.BoundingBox()
+        return box_solid((bbox.xmin, bbox.ymin, bbox.zmin), (bbox.xmax, bbox.ymax, bbox.zmax), min_offset, max_offset)
+
+#Box over a hinge's analytic envelope with its fold axis moved to x
+def envelope_solid(hinge, x, min_offset=(0,0,0), max_offset=(0,0,0)):
+        lo, hi = hinge.envelope
+        return box_solid((lo[0]+x, lo[1], lo[2]), (hi[0]+x, hi[1], hi[2]), min_offset, max_offset)
+
+#Nut pocket and standoff tube solids keyed by (screw_diam, hex_nut_rad, standoff_h), shared by every box and placed as located instances
+_standoff_cache = {}
+
+def standoff_shapes(screw_diam, hex_nut_rad, standoff_h):
+    key = (screw_diam, hex_nut_rad, standoff_h)
+    if key not in _standoff_cache:
+        pocket = cq.Workplane("XY").sketch().regularPolygon(hex_nut_rad, 6).finalize().extrude(3).findSolid()
+        tube = cq.Workplane("XY").circle(2+screw_diam/2).circle(screw_diam/2).extrude(standoff_h).findSolid()
+        _standoff_cache[key] = (pocket, tube)
+    return _standoff_cache[key]
+
+#Screw latch on the ceiling and its screw hole in the base wall; dimensions.latch_w is its width
+latch_l = 10
+latch_h = 10
+latch_nut_r = 6.2/2
+latch_nut_h = 3
+latch_screw_diam = 3.6
+
+#Runs one HingeBox build step for dag.run, in this process or a worker
+def _feature(box, method, *args):
+    return getattr(box, method)(*args)
+
+#Location rotating by -angle about the Y-parallel hinge axis through (x, z), matching Workplane.rotate in hinge_box
+def axis_rotation(x, z, angle):
+    return cq.Location(cq.Vector(x, 0, z)) * cq.Location(cq.Vector(0, 0, 0), cq.Vector(0, 1, 0), -angle) * cq.Location(cq.Vector(-x, 0, -z))
+
 class HingeBox:
     def __init__(self, **args):
         self.opts = default_opts
@@ -30,15 +83,17 @@ class HingeBox:
                 full_opts[key] = val
         self.opts = full_opts
         #Recompute values for publically avail properties
-        self.box_ow =  self.opts["box_iw"] + self.opts["wall_thick"] * 2 
-        self.box_ol = self.opts["box_il"] + self.opts["wall_thick"] * 2
-        self.box_oh = self.opts["box_ih"] + self.opts["wall_thick"]
+        d = dimensions.box_dimensions(self.opts)
+        self.box_ow = d["box_ow"]
+        self.box_ol = d["box_ol"]
+        self.box_oh = d["box_oh"]
 
+    #Every nut pocket goes in one cut and every standoff tube in one fuse, however many mounting points there are
     def add_standoffs(self, b, pts, screw_diam=3.6, hex_nut_rad=6.2/2):
-        for pt in pts:
-            b = b.cut(cq.Workplane("XY", origin=(pt[0], pt[1], 0)).sketch().regularPolygon(hex_nut_rad, 6).finalize().extrude(3))
-            b = b.union(cq.Workplane("XY", origin=(pt[0], pt[1], self.opts["wall_thick"])).circle(2+screw_diam/2).circle(screw_diam/2).extrude(self.opts["standoff_h"]))
-        return b
+        batch = self.batch()
+        pocket, tube = standoff_shapes(screw_diam, hex_nut_rad, self.opts["standoff_h"])
+        b = cut_all(b, [pocket.moved(cq.Location(cq.Vector(pt[0], pt[1], 0))) for pt in pts], *batch)
+        return fuse_all(b, [tube.moved(cq.Location(cq.Vector(pt[0], pt[1], self.opts["wall_thick"]))) for pt in pts], *batch)
 
     def lid_cutout():
         driver_cutout_h = 26
@@ -46,98 +101,291 @@ class HingeBox:
         l = l.faces(">Z").workplane().move(0, board_l/2 - driver_cutout_h).rect(board_w + box_inner_margin, driver_cutout_h, centered=[1,0]).cutThruAll()
         return l
 
+    #Cutout callbacks either cut the solid themselves and return it, or return a list of cutouts.cutout specs (a plain list of specs works too)
+    #Returns the solid and the tool solids for the specs, all made against the uncut solid so the caller can subtract them in one batched cut
+    def box_cutout_tools(self, orig, cutouts):
+        specs = cutouts(self, orig) if callable(cutouts) else cutouts
+        if isinstance(specs, cq.Workplane):
+            return specs, []
+        return orig, cutout_tools(orig, specs)
+
+    #Loads the box from the BREP cache when the same options and arguments were built before
+    #Raises ValueError for infeasible options before any geometry is built
     def hinge_box(self, wall_angle = 0, ceil_angle = 0, screw_closure = 1, standoffs=[], export_stl=0, wall_cutouts=None, top_cutouts=None):
+        dimensions.validate_hinge_box(self.opts, hinge_default_opts, screw_closure)
+        geometry_opts = {key: val for key, val in self.opts.items() if key not in ("batch_booleans", "parallel_booleans", "feature_workers")}
+        args = {
+            "wall_angle": wall_angle,
+            "ceil_angle": ceil_angle,
+            "screw_closure": screw_closure,
+            "standoffs": standoffs,
+            "wall_cutouts": wall_cutouts,
+            "top_cutouts": top_cutouts,
+        }
+        with profiling.step("hinge_box"):
+            shapes = brep_cache.cache.cached("hinge_box", geometry_opts, args, lambda: {"hinge_box": self.build_hinge_box(**args).findSolid()}, modules=("hinge", "hinge_box", "dimensions", "booleans", "cutouts", "dag"))
+            b = profiling.result(cq.Workplane("XY").newObject([shapes["hinge_box"]]))
+
+            if(export_stl):
+                with profiling.step("hinge_box.export"):
+                    export.export_shapes({"hinged_box": b})
+
+        return b
+
+    #Hinge with the box's width and arm count, not built yet; its dimensions and envelope place everything around it
+    def box_hinge(self, folded_angle=0):
         o = self.opts
+        hinge = Hinge(folded_angle=folded_angle, batch_booleans=o["batch_booleans"], parallel_booleans=o["parallel_booleans"], fidelity=o["fidelity"])
+        hinge.fixed_width(o["box_il"]-1, n_socket_arms=o["n_socket_arms"])
+        return hinge
 
-        box_iw = o["box_iw"]
-        box_il = o["box_il"]
-        box_ih = o["box_ih"]
+    #x of the wall and ceiling hinge axes
+    def hinge_axes(self, hinge):
+        return self.box_ow/2 - hinge.ball_socket_x, self.box_ow/2 + self.box_oh - 3 * hinge.ball_socket_x
+
+    def hinge_blocks(self, hinge):
+        wall_thick = self.opts["wall_thick"]
+        hinge_blocker_w = 3
+        hinge_blocker_l = 7
+        hinge_blocker_h = 6
+        return (
+            cq.Workplane("XY", origin=(self.box_ow/2-wall_thick-hinge_blocker_w, 0, wall_thick)).box(hinge_blocker_w,hinge_blocker_l,hinge_blocker_h, centered=[0, 1, 0]),
+            cq.Workplane("XY", origin=(self.box_ow/2+self.box_oh-hinge.total_l-wall_thick-hinge_blocker_w, 0, wall_thick)).box(hinge_blocker_w,hinge_blocker_l,hinge_blocker_h, centered=[0, 1, 0]),
+        )
+
+    def batch(self):
+        return (self.opts["batch_booleans"], self.opts["parallel_booleans"], self.opts["fidelity"] == "preview")
+
+    def build_shell(self):
+        o = self.opts
         wall_thick = o["wall_thick"]
+        with profiling.step("hinge_box.shell"):
+            #Draw box outer contour
+            b = cq.Workplane("XY").box(self.box_ow, self.box_ol, self.box_oh, centered=[1,1,0])
+            #Hollow out box
+            b = b.faces(">Z").workplane().move(wall_thick, 0).rect(o["box_iw"] + wall_thick * 2, o["box_il"]).cutBlind(-o["box_ih"])
+            #Cut out notch for lid to sit on when folded up
+            return profiling.result(b.faces("<X").edges(">Z").workplane(centerOption="CenterOfMass",invert=1).rect(o["box_il"], wall_thick+0.5, centered=[1,0]).cutBlind(wall_thick))
 
-        box_ow = self.box_ow
-        box_ol = self.box_ol
-        box_oh = self.box_oh
-        
-        #Creates a bounding box for a hinge with some margins for clearance
-        def hinge_margin_bbox_solid(h):
-            return bbox_solid(h, (0, 0.5, 0), (0, 0.5, 1))
-
-        #Draw box outer contour
-        b = cq.Workplane("XY").box(box_ow, box_ol, box_oh, centered=[1,1,0])
-        #Hollow out box
-        b = b.faces(">Z").workplane().move(wall_thick, 0).rect(box_iw + wall_thick * 2, box_il).cutBlind(-box_ih)
-        #Cut out notch for lid to sit on when folded up
-        b = b.faces("<X").edges(">Z").workplane(centerOption="CenterOfMass",invert=1).rect(box_il, wall_thick+0.5, centered=[1,0]).cutBlind(wall_thick)
-        
+    #Adds the standoffs to the shell and collects the tools for the base's single deferred cut: wall cutouts and the latch hole
+    def build_base(self, screw_closure, standoffs, wall_cutouts, b):
+        box_cuts = []
         if wall_cutouts:
-            b = wall_cutouts(self, b)
+            with profiling.step("hinge_box.wall_cutouts"):
+                b, box_cuts = self.box_cutout_tools(b, wall_cutouts)
 
         if len(standoffs) > 0:
-            b = self.add_standoffs(b, standoffs)
-
-        #Create and position wall hinge
-        unfold_wallHinge = Hinge()
-        wallHinge = Hinge(folded_angle=wall_angle)
-        wall_hinge = wallHinge.fixed_width_hinge(box_il-1).translate((box_ow/2 - wallHinge.ball_socket_x,0,0))
-        unfold_wall_hinge = unfold_wallHinge.fixed_width_hinge(box_il-1).translate((box_ow/2 - wallHinge.ball_socket_x,0,0))
-        #Create and position ceiling hinge
-        unfold_ceilHinge = Hinge()
-        ceilHinge = Hinge(folded_angle=ceil_angle)
-        ceil_hinge = ceilHinge.fixed_width_hinge(box_il-1).translate((box_ow/2 + box_oh - 3 * ceilHinge.ball_socket_x, 0, 0))
-        unfold_ceil_hinge = unfold_ceilHinge.fixed_width_hinge(box_il-1).translate((box_ow/2 + box_oh - 3 * ceilHinge.ball_socket_x, 0, 0))
+            with profiling.step("hinge_box.standoffs"):
+                b = profiling.result(self.add_standoffs(b, standoffs))
 
-        hinge_blocker_w = 3
-        hinge_blocker_l = 7
-        hinge_blocker_h = 6
+        if screw_closure:
+            with profiling.step("hinge_box.latch_hole"):
+                box_cuts.append(b.faces("<X").workplane(origin=(0, 0, self.box_oh - self.opts["wall_thick"] - latch_h / 2 + 1)).circle(latch_screw_diam/2).extrude(-self.opts["wall_thick"], combine=False))
+        return {"base": b, "base_cuts": box_cuts}
+
+    #Builds the flat wall and ceiling panels next to the shell; the ceiling gets its hinge clearance, latch and top cutouts
+    def build_lid_panels(self, screw_closure, top_cutouts, b):
+        o = self.opts
+        box_il = o["box_il"]
+        wall_thick = o["wall_thick"]
+        box_ow = self.box_ow
+        box_oh = self.box_oh
+        batch = self.batch()
+        #Wall and ceiling hinges share their geometry; the panels only need its analytic envelope, so nothing is built here
+        hinge = self.box_hinge()
+        _, ceil_x = self.hinge_axes(hinge)
+
+        with profiling.step("hinge_box.panels"):
+            #Create wall (will lie flat on XY initially)
+            hinged_wall = b.faces(">X").workplane(origin=(0,0,0)).box(box_il-1, wall_thick, box_oh-hinge.total_l, centered=[1, 0, 0], combine=False)
+            #Create ceiling (will lie flat on XY initially next to wall)
+            hinged_ceil = hinged_wall.faces(">X").workplane().box(box_il-1, wall_thick, box_ow-hinge.total_l + hinge.ball_socket_x, centered=[1, 0, 0], combine=False)
+        with profiling.step("hinge_box.ceil_hinge_cut"):
+            #Cut hinge out of ceiling
+            hinged_ceil = profiling.result(cut_all(hinged_ceil, [envelope_solid(hinge, ceil_x)], *batch))
 
-        #Create wall (will lie flat on XY initially)
-        hinged_wall = b.faces(">X").workplane(origin=(0,0,0)).box(box_il-1, wall_thick, box_oh-wallHinge.total_l, centered=[1, 0, 0], combine=False)
-        #Create ceiling (will lie flat on XY initially next to wall)
-        hinged_ceil = hinged_wall.faces(">X").workplane().box(box_il-1, wall_thick, box_ow-ceilHinge.total_l + ceilHinge.ball_socket_x, centered=[1, 0, 0], combine=False)
-        #Cut hinge out of ceiling
-        hinged_ceil = hinged_ceil.cut(bbox_solid(unfold_ceil_hinge))
-        
         if screw_closure:
-            latch_w = 8
-            latch_l = 10
-            latch_h = 10
-            nut_r = 6.2/2
-            nut_h = 3
-            screw_diam = 3.6
-            #Add ceiling nut holder for case screw latch
-            latch = cq.Workplane("XY").box(latch_w, latch_l, latch_h, centered=[0, 1, 0])  
-            latch = latch.faces(">X").workplane(origin=(0, 0, latch_h/2)).circle(screw_diam/2).cutBlind(-latch_w)
-            latch = latch.faces(">X").workplane(origin=(0, 0, latch_h/2), offset=-latch_w).sketch().regularPolygon(nut_r, 6).finalize().cutBlind(nut_h)
-            hinged_ceil = hinged_ceil.union(latch.translate((3*box_ow/2 + box_oh - 2*ceilHinge.total_l + ceilHinge.ball_socket_x - wall_thick - latch_w - 1, 0, wall_thick)))
-            #Cut latch hole
-            b = b.faces("<X").workplane(origin=(0, 0, box_oh - wall_thick - latch_h / 2 + 1)).circle(screw_diam/2).cutBlind(-wall_thick)
+            latch_w = dimensions.latch_w
+            with profiling.step("hinge_box.latch"):
+                #Add ceiling nut holder for case screw latch
+                latch = cq.Workplane("XY").box(latch_w, latch_l, latch_h, centered=[0, 1, 0])  
+                latch = latch.faces(">X").workplane(origin=(0, 0, latch_h/2)).circle(latch_screw_diam/2).cutBlind(-latch_w)
+                latch = latch.faces(">X").workplane(origin=(0, 0, latch_h/2), offset=-latch_w).sketch().regularPolygon(latch_nut_r, 6).finalize().cutBlind(latch_nut_h)
+                hinged_ceil = profiling.result(fuse_all(hinged_ceil, [latch.translate((3*box_ow/2 + box_oh - 2*hinge.total_l + hinge.ball_socket_x - wall_thick - latch_w - 1, 0, wall_thick))], *batch))
 
         if top_cutouts:
-            hinged_ceil = top_cutouts(self, hinged_ceil)
-        
+            with profiling.step("hinge_box.top_cutouts"):
+                hinged_ceil, top_tools = self.box_cutout_tools(hinged_ceil, top_cutouts)
+                hinged_ceil = profiling.result(cut_all(hinged_ceil, top_tools, *batch))
+
+        return {"wall": hinged_wall, "ceil": hinged_ceil}
+
+    #Unplaced ball and socket halves shared by both of the box's hinges
+    def build_hinge_halves(self):
+        parts = self.box_hinge().hinge_parts()
+        return {"ball_hinge": parts["ball_hinge"].findSolid(), "socket_hinge": parts["socket_hinge"].findSolid()}
+
+    #Builds every angle-independent piece of the box: the base shell, the flat wall and ceiling panels and the envelopes of the unfolded hinges
+    def build_panels(self, screw_closure = 1, standoffs=[], wall_cutouts=None, top_cutouts=None):
+        b = self.build_shell()
+        p = dict(self.build_base(screw_closure, standoffs, wall_cutouts, b), **self.build_lid_panels(screw_closure, top_cutouts, b))
+        hinge = self.box_hinge()
+        wall_x, ceil_x = self.hinge_axes(hinge)
+        wall_hinge_block, ceil_hinge_block = self.hinge_blocks(hinge)
+        return dict(p,
+            hinge=hinge,
+            wall_x=wall_x,
+            ceil_x=ceil_x,
+            wall_envelope=envelope_solid(hinge, wall_x),
+            ceil_envelope=envelope_solid(hinge, ceil_x),
+            wall_hinge_block=wall_hinge_block,
+            ceil_hinge_block=ceil_hinge_block,
+        )
+
+    #Folds the ceiling onto the wall panel and adds the ceiling hinge; returns the wall with everything it carries, rotated to wall_angle
+    def build_lid(self, wall_angle, ceil_angle, panels, halves):
+        batch = self.batch()
+        ceilHinge = self.box_hinge(ceil_angle)
+        ceilHinge.seed_halves(halves)
+        wall_x, ceil_x = self.hinge_axes(ceilHinge)
+        with profiling.step("hinge_box.ceil_hinge"):
+            ceil_hinge = ceilHinge.hinge().translate((ceil_x, 0, 0))
+
         #Rotate ceiling around it's physical axis of rotation
-        hinged_ceil = hinged_ceil.rotate((box_ow/2 + box_oh - 3 * ceilHinge.ball_socket_x, 0, ceilHinge.ball_socket_z), (box_ow/2 + box_oh - 3 * ceilHinge.ball_socket_x, 1, ceilHinge.ball_socket_z), -ceil_angle)
-        #Combine wall and ceiling w/ ceiling hinge 
-        hinged_wall = hinged_wall.union(hinged_ceil).cut(bbox_solid(unfold_ceil_hinge)).union(ceil_hinge)
-        hinged_wall = hinged_wall.cut(bbox_solid(unfold_wall_hinge))
-        #Add hinge blocker for ceiling
-        ceil_hinge_block = cq.Workplane("XY", origin=(box_ow/2+box_oh-ceilHinge.total_l-wall_thick-hinge_blocker_w, 0, wall_thick)).box(hinge_blocker_w,hinge_blocker_l,hinge_blocker_h, centered=[0, 1, 0])
-        hinged_wall = hinged_wall.union(ceil_hinge_block)
+        hinged_ceil = panels["ceil"].rotate((ceil_x, 0, ceilHinge.ball_socket_z), (ceil_x, 1, ceilHinge.ball_socket_z), -ceil_angle)
+        #Combine wall and ceiling, clear both hinge envelopes, then add the ceiling hinge and its blocker
+        with profiling.step("hinge_box.wall_ceil_fuse"):
+            hinged_wall = profiling.result(fuse_all(panels["wall"], [hinged_ceil], *batch))
+        with profiling.step("hinge_box.hinge_clearance_cuts"):
+            hinged_wall = profiling.result(cut_all(hinged_wall, [envelope_solid(ceilHinge, ceil_x), envelope_solid(ceilHinge, wall_x)], *batch))
+        with profiling.step("hinge_box.ceil_hinge_fuse"):
+            hinged_wall = profiling.result(fuse_all(hinged_wall, [ceil_hinge, self.hinge_blocks(ceilHinge)[1]], *batch))
         #Rotate wall around it's physical axis of rotation
-        hinged_wall = hinged_wall.rotate((box_ow/2  - wallHinge.ball_socket_x, 0, wallHinge.ball_socket_z), (box_ow/2 - wallHinge.ball_socket_x, 1, wallHinge.ball_socket_z), -wall_angle) 
+        return hinged_wall.rotate((wall_x, 0, ceilHinge.ball_socket_z), (wall_x, 1, ceilHinge.ball_socket_z), -wall_angle)
 
-        #Cutout clearance for hinge on box before adding hinged wall
-        b = b.faces(">X").cut(hinge_margin_bbox_solid(wall_hinge))
-        #Combine base box and hinged wall + ceiling w/ ceiling hinge 
-        b = b.union(hinged_wall).union(wall_hinge)
-        #Create wall hinge blockers
-        wall_hinge_block = cq.Workplane("XY", origin=(box_ow/2-wall_thick-hinge_blocker_w, 0, wall_thick)).box(hinge_blocker_w,hinge_blocker_l,hinge_blocker_h, centered=[0, 1, 0])
-        b = b.union(wall_hinge_block)
+    #Places the wall hinge and cuts the latch hole, wall cutouts and hinge clearance out of the base
+    def build_base_cut(self, wall_angle, base, halves):
+        wallHinge = self.box_hinge(wall_angle)
+        wallHinge.seed_halves(halves)
+        wall_x, _ = self.hinge_axes(wallHinge)
+        with profiling.step("hinge_box.wall_hinge"):
+            wall_hinge = wallHinge.hinge().translate((wall_x, 0, 0))
+        #Clearance for the hinge with some margin; an unfolded hinge uses its exact envelope, a folded one is measured
+        if wall_angle <= 0:
+            margin = envelope_solid(wallHinge, wall_x, (0, 0.5, 0), (0, 0.5, 1))
+        else:
+            margin = bbox_solid(wall_hinge, (0, 0.5, 0), (0, 0.5, 1))
+        with profiling.step("hinge_box.base_cuts"):
+            b = profiling.result(cut_all(base["base"], base["base_cuts"] + [margin], *self.batch()))
+        return {"base": b, "wall_hinge": wall_hinge}
 
-        if(export_stl):
-            cq.exporters.export(b, "stl/hinged_box.stl")
+    #The box is a small graph of feature tasks: shell -> base and panels, hinge halves, then the folded lid and the cut base, then one final fuse
+    #With feature_workers the branches run concurrently in worker processes; cutout callbacks that cannot be pickled keep the build in this process
+    def build_hinge_box(self, wall_angle = 0, ceil_angle = 0, screw_closure = 1, standoffs=[], wall_cutouts=None, top_cutouts=None):
+        workers = self.opts["feature_workers"]
+        if workers:
+            try:
+                pickle.dumps((self, standoffs, wall_cutouts, top_cutouts))
+            except Exception:
+                workers = 0
+        tasks = {
+            "shell": (_feature, (self, "build_shell"), ()),
+            "base": (_feature, (self, "build_base", screw_closure, standoffs, wall_cutouts), ("shell",)),
+            "panels": (_feature, (self, "build_lid_panels", screw_closure, top_cutouts), ("shell",)),
+            "halves": (_feature, (self, "build_hinge_halves"), ()),
+            "lid": (_feature, (self, "build_lid", wall_angle, ceil_angle), ("panels", "halves")),
+            "base_cut": (_feature, (self, "build_base_cut", wall_angle), ("base", "halves")),
+        }
+        with profiling.step("hinge_box.features"):
+            r = dag.run(tasks, workers)
+
+        #Combine base box and hinged wall + ceiling w/ ceiling hinge and wall hinge blockers
+        with profiling.step("hinge_box.final_fuse"):
+            return profiling.result(fuse_all(r["base_cut"]["base"], [r["lid"], r["base_cut"]["wall_hinge"], self.hinge_blocks(self.box_hinge())[0]], *self.batch()))
+
+    #Builds the three rigid bodies of the box in their unfolded pose: base (+ wall hinge socket half), wall (+ wall hinge ball half and ceiling hinge socket half) and ceiling (+ ceiling hinge ball half)
+    #The base clearance cut covers the folded wall hinge at every angle in wall_angles
+    def rigid_bodies(self, wall_angles=(0,), screw_closure = 1, standoffs=[], wall_cutouts=None, top_cutouts=None):
+        dimensions.validate_hinge_box(self.opts, hinge_default_opts, screw_closure)
+        def build():
+            batch = self.batch()
+            p = self.build_panels(screw_closure, standoffs, wall_cutouts, top_cutouts)
+            hinge = p["hinge"]
+            bsx = hinge.ball_socket_x
+            bsz = hinge.ball_socket_z
+            parts = hinge.hinge_parts()
+            ball = parts["ball_hinge"].findSolid()
+            socket = parts["socket_hinge"].findSolid()
+
+            #Halves in their unfolded hinge.hinge() placement, moved onto each hinge axis
+            def ball_half(x):
+                return ball.moved(cq.Location(cq.Vector(x - bsx, 0, 0)))
+            def socket_half(x):
+                return socket.moved(cq.Location(cq.Vector(x + bsx, 0, 0), cq.Vector(0, 0, 1), 180))
+
+            wall_x = p["wall_x"]
+            ceil_x = p["ceil_x"]
+            swept_wall_hinge = cq.Compound.makeCompound([socket_half(wall_x)] + [ball_half(wall_x).moved(axis_rotation(wall_x, bsz, a)) for a in wall_angles])
+            base = cut_all(p["base"], p["base_cuts"] + [bbox_solid(swept_wall_hinge, (0, 0.5, 0), (0, 0.5, 1))], *batch)
+            base = fuse_all(base, [socket_half(wall_x), p["wall_hinge_block"]], *batch)
+            wall = cut_all(p["wall"], [p["ceil_envelope"], p["wall_envelope"]], *batch)
+            wall = fuse_all(wall, [ball_half(wall_x), socket_half(ceil_x), p["ceil_hinge_block"]], *batch)
+            ceil = fuse_all(p["ceil"], [ball_half(ceil_x)], *batch)
+            return {"base": base.findSolid(), "wall": wall.findSolid(), "ceil": ceil.findSolid()}
+
+        geometry_opts = {key: val for key, val in self.opts.items() if key not in ("batch_booleans", "parallel_booleans", "feature_workers")}
+        args = {
+            "wall_angles": sorted(set(wall_angles)),
+            "screw_closure": screw_closure,
+            "standoffs": standoffs,
+            "wall_cutouts": wall_cutouts,
+            "top_cutouts": top_cutouts,
+        }
+        fetch = lambda: brep_cache.cache.cached("hinge_box_bodies", geometry_opts, args, build, modules=("hinge", "hinge_box", "dimensions", "booleans", "cutouts", "dag"))
+        #Kept in memory too, so a preview at a new angle reuses the very same shapes and their meshes
+        try:
+            return memoized("hinge_box_bodies", [geometry_opts, args], fetch)
+        except brep_cache.Unhashable:
+            return fetch()
+
+    #Builds the rigid bodies once and returns one placement per angle, either as cq.Assembly objects or as compounds
+    #angles holds single values (wall and ceiling fold together) or (wall_angle, ceil_angle) pairs
+    #Unlike hinge_box the bodies stay rigid, so the ceiling is never re-trimmed by the wall's hinge envelope after folding
+    #With clearance_angles the base's hinge clearance covers that fixed sweep (plus any wall angle outside it) instead of exactly these angles, so other angles in its range reuse the same bodies
+    def fold_sweep(self, angles, compounds=0, screw_closure = 1, standoffs=[], wall_cutouts=None, top_cutouts=None, clearance_angles=None):
+        #Plain floats, so numpy scalars are accepted and give the same cache keys
+        poses = [(float(a), float(a)) if isinstance(a, numbers.Real) else tuple(float(v) for v in a) for a in angles]
+        wall_angles = [w for w, _ in poses]
+        if clearance_angles is not None:
+            clearance_angles = [float(a) for a in clearance_angles]
+            wall_angles = clearance_angles + [w for w in wall_angles if not min(clearance_angles) <= w <= max(clearance_angles)]
+        bodies = self.rigid_bodies(wall_angles, screw_closure, standoffs, wall_cutouts, top_cutouts)
+
+        hinge = self.box_hinge()
+        wall_x, ceil_x = self.hinge_axes(hinge)
+        alpha = 0.5
+
+        sweep = []
+        for wall_angle, ceil_angle in poses:
+            wall_loc = axis_rotation(wall_x, hinge.ball_socket_z, wall_angle)
+            ceil_loc = wall_loc * axis_rotation(ceil_x, hinge.ball_socket_z, ceil_angle)
+            if compounds:
+                sweep.append(cq.Compound.makeCompound([bodies["base"], bodies["wall"].moved(wall_loc), bodies["ceil"].moved(ceil_loc)]))
+            else:
+                sweep.append(cq.Assembly(name="hinge_box_%g_%g" % (wall_angle, ceil_angle))
+                    .add(bodies["base"], name="base", color=cq.Color(0.2,0,0,alpha))
+                    .add(bodies["wall"], name="wall", loc=wall_loc, color=cq.Color(0,0.2,0,alpha))
+                    .add(bodies["ceil"], name="ceil", loc=ceil_loc, color=cq.Color(0,0,0.2,alpha)))
+        return sweep
+
+    #Writes the box at every angle to one light-weight .glb/.3mf scene, each pose spacing mm further along Y
+    #The three rigid bodies are built for the clearance_angles sweep and meshed once (and stay cached), so every extra or later angle only adds transforms
+    def export_preview(self, path, angles=(0, 90), spacing=0, clearance_angles=range(0, 181, 5), **args):
+        scene = cq.Assembly(name="hinge_box_preview")
+        for i, pose in enumerate(self.fold_sweep(angles, clearance_angles=clearance_angles)):
+            scene.add(pose, loc=cq.Location(cq.Vector(0, spacing * i, 0)))
+        return preview.export_preview(scene, path, **args)
 
-        return b
     def demo(self):  
         show_object(self.hinge_box(export_stl=0))
         show_object(self.hinge_box(90, 90).translate((0, self.opts["box_il"] * 1.5, 0)))
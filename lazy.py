@@ -0,0 +1,19 @@
+import importlib.util
+import sys
+
+#Keeps `import cadquery` (which pulls in OCP and takes seconds) off the import path of modules that may never build geometry
+#module("cadquery") returns a stand-in that imports the real package on first attribute access, so `cq.Workplane` works unchanged inside functions
+#Only pure-Python packages can be deferred this way; OCP extension modules are imported inside the functions that use them
+
+def module(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError("No module named %r" % name, name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod
+    loader.exec_module(mod)
+    return mod
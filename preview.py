@@ -0,0 +1,109 @@
+import collections
+
+import export
+import lazy
+
+cq = lazy.module("cadquery")
+np = lazy.module("numpy")
+
+#Light-weight meshes for looking at folded boxes and hinges, instead of sending full-resolution compounds to the viewer
+#Each part is tessellated with deflections scaled to its own size, so small hinge arms and large panels get the same relative detail
+#Angular deflection bounds the error on curved faces (balls, sockets, fillets), so flat faces stay a few triangles while curves get what they need
+#Meshes are cached per shape and level of detail: a fold sweep, or the same box at a new angle, only adds transforms
+#
+#    preview.export_preview(HingeBox().fold_sweep([0, 45, 90]), "stl/box.glb", part_lod={"base": "low"})
+
+#Linear deflection as a fraction of the part's bounding-box diagonal and angular deflection in radians
+lods = {
+    "high": {"relative": 0.0005, "angular_tolerance": 0.2},
+    "medium": {"relative": 0.002, "angular_tolerance": 0.5},
+    "low": {"relative": 0.008, "angular_tolerance": 1.0},
+}
+
+default_opts = {
+    "lod": "medium",
+    "part_lod": {}, #{assembly node name: lod}; a node's level applies to everything below it
+    "decimate": 0, #vertex clustering cell as a fraction of the part's diagonal; 0 keeps every triangle
+    "min_tolerance": 0.005, #floor on the linear deflection in mm
+}
+
+#Meshes keyed by (B-rep hash, lod, decimate), least recently used dropped first
+cache_size = 256
+cache_stats = {"hits": 0, "misses": 0}
+_meshes = collections.OrderedDict()
+#B-rep hashes keyed by TShape, so located copies of one shape skip hashing; bounded like the meshes since each key keeps its shape alive
+_geometry_keys = collections.OrderedDict()
+
+#Merges vertices that fall in the same cell and drops the triangles that collapse
+def decimate(vertices, triangles, cell):
+    if not len(triangles):
+        return vertices, triangles
+    cells = np.floor(vertices / cell).astype(np.int64)
+    _, first, inverse = np.unique(cells, axis=0, return_index=True, return_inverse=True)
+    tris = inverse.reshape(-1)[triangles]
+    tris = tris[(tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & (tris[:, 0] != tris[:, 2])]
+    return vertices[first], np.unique(tris, axis=0).astype(np.uint32)
+
+#Returns (vertices, triangles) for a shape at the identity location, from the cache when the same B-rep was meshed before
+def mesh(base, lod="medium", decimate_cell=0, min_tolerance=default_opts["min_tolerance"]):
+    tshape = base.wrapped.TShape()
+    if tshape in _geometry_keys:
+        _geometry_keys.move_to_end(tshape)
+    else:
+        _geometry_keys[tshape] = export._geometry_key(base)
+        while len(_geometry_keys) > cache_size:
+            _geometry_keys.popitem(last=False)
+    key = (_geometry_keys[tshape], lod, decimate_cell)
+    if key in _meshes:
+        cache_stats["hits"] += 1
+        _meshes.move_to_end(key)
+        return _meshes[key]
+    cache_stats["misses"] += 1
+    diag = base.BoundingBox().DiagonalLength
+    #Mesh a copy without triangulation so a coarser level is not served a finer mesh left on the shape, and the caller's shape keeps its own
+    base = base.copy(mesh=False)
+    vertices, triangles = export.triangulate(base, max(lods[lod]["relative"] * diag, min_tolerance), lods[lod]["angular_tolerance"])
+    if decimate_cell:
+        vertices, triangles = decimate(vertices, triangles, decimate_cell * diag)
+    _meshes[key] = (vertices, triangles)
+    while len(_meshes) > cache_size:
+        _meshes.popitem(last=False)
+    return _meshes[key]
+
+def _lod(name, opts):
+    for node in reversed(name.split("/")[:-1]):
+        if node in opts["part_lod"]:
+            return opts["part_lod"][node]
+    return opts["lod"]
+
+#Flattens an assembly into unique preview meshes plus (name, mesh index, 4x4 world matrix) instances, like export.collect_instances
+def collect_instances(assy, **args):
+    opts = default_opts.copy()
+    for key, val in args.items():
+        if key in opts:
+            opts[key] = val
+    for lod in set([opts["lod"]] + list(opts["part_lod"].values())):
+        if lod not in lods:
+            raise ValueError("unknown level of detail %r, expected one of %s" % (lod, ", ".join(lods)))
+    meshes = []
+    index = {}
+    instances = []
+    for name, base, m in export.iter_solids(assy):
+        part = mesh(base, _lod(name, opts), opts["decimate"], opts["min_tolerance"])
+        if id(part) not in index:
+            index[id(part)] = len(meshes)
+            meshes.append(part)
+        instances.append((name, index[id(part)], m))
+    return meshes, instances
+
+#Writes an assembly (or a list of them, e.g. from HingeBox.fold_sweep) as one instanced .glb or .3mf preview
+#Returns {"path", "meshes", "instances", "triangles"}
+def export_preview(assy, path, **args):
+    if isinstance(assy, (list, tuple)):
+        scene = cq.Assembly(name="preview")
+        for a in assy:
+            scene.add(a)
+        assy = scene
+    meshes, instances = collect_instances(assy, **args)
+    export.write_scene(path, meshes, instances)
+    return {"path": path, "meshes": len(meshes), "instances": len(instances), "triangles": sum(len(t) for _, t in meshes)}
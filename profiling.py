@@ -0,0 +1,147 @@
+import atexit
+import json
+import os
+import sys
+import time
+import types
+from contextlib import contextmanager
+
+#Opt-in per-step timing for the feature steps of Hinge, HingeBox and board_case
+#Steps nest, and each is keyed by its ";"-joined stack of stable names, so traces from different runs can be diffed line by line
+#CQ_HINGE_PROFILE=trace.json (or trace.folded) profiles the whole process and writes the trace at exit
+
+default_opts = {
+    "path": os.environ.get("CQ_HINGE_PROFILE") or None,
+}
+
+_enabled = bool(default_opts["path"])
+_stack = []
+_stats = {}
+_events = []
+_origin = time.perf_counter()
+
+def enabled():
+    return _enabled
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+    if on:
+        _import_step()
+
+def reset():
+    global _origin
+    _stack.clear()
+    _stats.clear()
+    _events.clear()
+    _origin = time.perf_counter()
+
+#Counts faces on the shapes a step produced; anything that is not a shape or workplane counts as None
+def _faces(result):
+    import cadquery as cq
+    if isinstance(result, cq.Workplane):
+        return sum(len(v.Faces()) for v in result.vals() if isinstance(v, cq.Shape))
+    if isinstance(result, cq.Shape):
+        return len(result.Faces())
+    return None
+
+#Times the enclosed block as one call of the named step; a no-op unless profiling is enabled
+@contextmanager
+def step(name):
+    if not _enabled:
+        yield
+        return
+    frame = {"name": name, "faces": None, "child_s": 0.0}
+    _stack.append(frame)
+    path = ";".join(f["name"] for f in _stack)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - start
+        _stack.pop()
+        if _stack:
+            _stack[-1]["child_s"] += wall
+        s = _stats.setdefault(path, {"calls": 0, "wall_s": 0.0, "self_s": 0.0, "faces": None})
+        s["calls"] += 1
+        s["wall_s"] += wall
+        s["self_s"] += wall - frame["child_s"]
+        if frame["faces"] is not None:
+            s["faces"] = frame["faces"]
+        _events.append({"name": name, "ph": "X", "ts": round((start - _origin) * 1e6, 1), "dur": round(wall * 1e6, 1), "pid": os.getpid(), "tid": 0, "args": {"path": path, "faces": frame["faces"]}})
+
+#CadQuery is imported lazily; load it as its own step so the import is not charged to whichever feature step first touches cq
+def _import_step():
+    mod = sys.modules.get("cadquery")
+    if mod is not None and type(mod) is types.ModuleType:
+        return
+    with step("import_cadquery"):
+        import cadquery
+        cadquery.Workplane
+
+#Records the face count of a step's result on the innermost open step and passes the result through
+def result(val):
+    if _enabled and _stack:
+        _stack[-1]["faces"] = _faces(val)
+    return val
+
+#Aggregated per-step totals sorted by step path
+def summary():
+    return [dict(path=path, name=path.rsplit(";", 1)[-1], **{k: round(v, 6) if isinstance(v, float) else v for k, v in s.items()}) for path, s in sorted(_stats.items())]
+
+#Brendan Gregg's folded stack format (self time in microseconds), readable by flamegraph.pl, speedscope and inferno
+def folded():
+    return "".join("%s %d\n" % (path, round(s["self_s"] * 1e6)) for path, s in sorted(_stats.items()))
+
+#Writes a .folded/.txt flame-graph input or a JSON trace holding the step summary plus Chrome trace events (chrome://tracing, Perfetto, speedscope)
+def dump(path):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        if path.endswith((".folded", ".txt")):
+            f.write(folded())
+        else:
+            json.dump({"steps": summary(), "traceEvents": _events, "displayTimeUnit": "ms"}, f, indent=1)
+    return path
+
+#Profiles just the enclosed block and writes the trace to path when given
+@contextmanager
+def profile(path=None):
+    global _enabled
+    was_enabled = _enabled
+    reset()
+    _enabled = True
+    _import_step()
+    try:
+        yield
+    finally:
+        _enabled = was_enabled
+        if path:
+            dump(path)
+
+def _dump_at_exit():
+    if _enabled and default_opts["path"] and _stats:
+        dump(default_opts["path"])
+
+atexit.register(_dump_at_exit)
+
+if _enabled:
+    _import_step()
+
+#Prints per-step wall time for two JSON traces side by side
+def diff(old_path, new_path):
+    with open(old_path) as f:
+        old = {s["path"]: s for s in json.load(f)["steps"]}
+    with open(new_path) as f:
+        new = {s["path"]: s for s in json.load(f)["steps"]}
+    print("%-70s %10s %10s %8s" % ("step", "old_s", "new_s", "ratio"))
+    for path in sorted(set(old) | set(new)):
+        o = old.get(path, {}).get("wall_s")
+        n = new.get(path, {}).get("wall_s")
+        ratio = "%7.2fx" % (n / o) if o and n is not None else "      -"
+        print("%-70s %10s %10s %s" % (path, "%.4f" % o if o is not None else "-", "%.4f" % n if n is not None else "-", ratio))
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "diff":
+        sys.exit("usage: python profiling.py diff OLD.json NEW.json")
+    diff(sys.argv[2], sys.argv[3])
@@ -0,0 +1,247 @@
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import batch
+import export
+
+#Local generation service: a warm pool of worker processes behind HTTP (or a Unix socket) on this machine
+#Workers import CadQuery once and keep Hinge's arm cache and HingeBox's standoff cache in memory between requests
+#Identical requests that arrive while one is still building share that build
+#
+#    python server.py --port 8765
+#    curl -s localhost:8765/build -d '{"kind": "hinge_box", "wall_angle": 90}' -o box.stl
+#
+#POST /build  body is one batch.py row as JSON, plus optional "format" ("stl"/"3mf") and "preset"; replies with the mesh
+#POST /check  replies {"ok": bool, "problems": [...]} from the dimensions engine without building
+#GET  /health replies with pool and request counters
+
+default_opts = {
+    "host": "127.0.0.1",
+    "port": 8765,
+    "unix_socket": None, #serve on this socket path instead of TCP
+    "workers": None, #worker processes; None uses one per core
+    "warm": 1, #build a default hinge in every worker at start so the arm geometry is already memoized
+    "timeout": 600, #seconds a request may wait for its build
+}
+
+content_types = {"stl": "model/stl", "3mf": "model/3mf"}
+
+#Set in each worker by _warm_worker; start-up pings wait on it so every worker takes exactly one
+_barrier = None
+
+def _warm_worker(warm, barrier):
+    global _barrier
+    _barrier = barrier
+    import cadquery
+    if warm:
+        from hinge import Hinge
+        Hinge().hinge_parts()
+
+def _ping(timeout):
+    try:
+        _barrier.wait(timeout)
+    except threading.BrokenBarrierError:
+        pass
+    return os.getpid()
+
+#Runs in a worker: builds one row into a temporary directory and returns the mesh bytes
+def render(row, export_opts):
+    with tempfile.TemporaryDirectory() as out_dir:
+        result = batch.build_row(0, row, out_dir, export_opts)
+        with open(result["path"], "rb") as f:
+            data = f.read()
+    return {"seconds": result["seconds"], "data": data}
+
+class Service:
+    def __init__(self, **args):
+        self.opts = default_opts.copy()
+        for key, val in args.items():
+            if key in self.opts:
+                self.opts[key] = val
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.stats = {"requests": 0, "builds": 0, "coalesced": 0, "rejected": 0, "failed": 0}
+        self.pool = None
+        self.workers = 0
+
+    #Starts the pool and waits until every worker has imported CadQuery (and built its warm-up hinge)
+    def start(self):
+        workers = self.opts["workers"] or os.cpu_count() or 1
+        #spawn keeps workers independent of the server's threads and lets a broken pool be replaced safely
+        context = multiprocessing.get_context("spawn")
+        #One ping per worker, each held at the barrier until all have arrived, so no worker can answer twice while another is still starting
+        barrier = context.Barrier(workers)
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_warm_worker, initargs=(self.opts["warm"], barrier))
+        pids = {f.result() for f in [self.pool.submit(_ping, self.opts["timeout"]) for _ in range(workers)]}
+        self.workers = len(pids)
+        return self.workers
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown(cancel_futures=True)
+
+    #Returns (row, export_opts, problems); the name only picks the file name, so it is left out of the coalescing key
+    def parse(self, body):
+        row = dict(body)
+        export_opts = {"format": row.pop("format", "stl"), "preset": row.pop("preset", "coarse")}
+        if export_opts["format"] not in content_types:
+            return row, export_opts, ["format must be one of %s" % ", ".join(sorted(content_types))]
+        if export_opts["preset"] not in export.presets:
+            return row, export_opts, ["preset must be one of %s" % ", ".join(sorted(export.presets))]
+        _, problems = batch.check_row(0, row)
+        return row, export_opts, problems
+
+    #Returns a future for the mesh, joining an identical build that is still running
+    def submit(self, row, export_opts):
+        key = json.dumps({"row": {k: v for k, v in row.items() if k != "name"}, "export": export_opts}, sort_keys=True)
+        with self.lock:
+            self.stats["requests"] += 1
+            future = self.inflight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                return future
+            try:
+                future = self.pool.submit(render, dict(row, name="part"), export_opts)
+            except BrokenProcessPool:
+                #A worker crashed inside OCC; replace the pool and carry on
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.start()
+                future = self.pool.submit(render, dict(row, name="part"), export_opts)
+            self.stats["builds"] += 1
+            self.inflight[key] = future
+        future.add_done_callback(lambda f: self._finish(key))
+        return future
+
+    def _finish(self, key):
+        with self.lock:
+            self.inflight.pop(key, None)
+
+    def health(self):
+        with self.lock:
+            return dict(self.stats, inflight=len(self.inflight), workers=self.workers)
+
+class Handler(BaseHTTPRequestHandler):
+    service = None
+
+    def _json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(body, dict):
+            raise ValueError("request body must be a JSON object")
+        return body
+
+    def do_GET(self):
+        if self.path == "/health":
+            return self._json(200, self.service.health())
+        self._json(404, {"error": "unknown path %s" % self.path})
+
+    def do_POST(self):
+        try:
+            body = self._body()
+        except ValueError as e:
+            return self._json(400, {"error": "invalid JSON: %s" % e})
+        if self.path not in ("/build", "/check"):
+            return self._json(404, {"error": "unknown path %s" % self.path})
+        try:
+            row, export_opts, problems = self.service.parse(body)
+        except Exception as e:
+            return self._json(400, {"error": "invalid options", "problems": ["%s: %s" % (type(e).__name__, e)]})
+        if self.path == "/check":
+            return self._json(200, {"ok": not problems, "problems": problems})
+        if problems:
+            with self.service.lock:
+                self.service.stats["rejected"] += 1
+            return self._json(400, {"error": "infeasible options", "problems": problems})
+
+        start = time.perf_counter()
+        try:
+            result = self.service.submit(row, export_opts).result(timeout=self.service.opts["timeout"])
+        except Exception as e:
+            with self.service.lock:
+                self.service.stats["failed"] += 1
+            return self._json(500, {"error": "%s: %s" % (type(e).__name__, e)})
+
+        data = result["data"]
+        #Only filename-safe characters reach the header, so quotes or CR/LF in the name cannot break or add headers
+        name = re.sub(r"[^A-Za-z0-9._-]", "_", str(row.get("name", row.get("kind", "hinge_box"))))[:100] or "part"
+        self.send_response(200)
+        self.send_header("Content-Type", content_types[export_opts["format"]])
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Content-Disposition", 'attachment; filename="%s.%s"' % (name, export_opts["format"]))
+        self.send_header("X-Build-Seconds", str(result["seconds"]))
+        self.send_header("X-Request-Seconds", "%.3f" % (time.perf_counter() - start))
+        self.end_headers()
+        for i in range(0, len(data), 1 << 16):
+            self.wfile.write(data[i:i + (1 << 16)])
+
+    #Unix socket peers have no (host, port) address
+    def address_string(self):
+        return self.client_address[0] if isinstance(self.client_address, tuple) and self.client_address else "unix"
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+#Starts the pool and serves until interrupted
+def serve(**args):
+    service = Service(**args)
+    opts = service.opts
+    started = time.perf_counter()
+    workers = service.start()
+    print("%d workers warm in %.1f s" % (workers, time.perf_counter() - started), file=sys.stderr, flush=True)
+    handler = type("BoundHandler", (Handler,), {"service": service})
+    if opts["unix_socket"]:
+        httpd = UnixHTTPServer(opts["unix_socket"], handler)
+        where = opts["unix_socket"]
+    else:
+        httpd = ThreadingHTTPServer((opts["host"], opts["port"]), handler)
+        where = "http://%s:%d" % (opts["host"], httpd.server_address[1])
+    print("serving on %s" % where, file=sys.stderr, flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.close()
+        if opts["unix_socket"] and os.path.exists(opts["unix_socket"]):
+            os.remove(opts["unix_socket"])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve hinge and hinge box meshes from a warm local worker pool")
+    parser.add_argument("--host", default=default_opts["host"])
+    parser.add_argument("--port", type=int, default=default_opts["port"])
+    parser.add_argument("--unix-socket", help="serve on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--no-warm", action="store_true", help="skip the warm-up hinge build in each worker")
+    args = parser.parse_args(argv)
+    serve(host=args.host, port=args.port, unix_socket=args.unix_socket, workers=args.workers, warm=not args.no_warm)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())